@@ -1,13 +1,37 @@
 # main.py - API Python complète pour scraping ERAC sur Railway
 # V3.2 - Support bilingue FR/DE pour adresses, dates, fuel, VIN
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, Response
 import requests
 from bs4 import BeautifulSoup
 import os
 from datetime import datetime
 import time
 import re
+import gzip
+import hashlib
+import hmac
+import sqlite3
+import sys
+import json
+import threading
+import queue
+import random
+from collections import deque
+import csv
+import io
+from bisect import bisect_left, bisect_right
+import cProfile
+import pstats
+import contextlib
+
+# Optionnel : export colonnaire (Arrow / Parquet)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
 
 app = Flask(__name__)
 
@@ -19,12 +43,24 @@ def home():
         "version": "3.2",
         "endpoints": {
             "/": "GET - Informations de l'API",
-            "/scrape/france": "GET - Scraping ERAC France (avec VIN)",
-            "/scrape/germany": "GET - Scraping ERAC Germany (avec VIN)",
-            "/scrape/germany/tenders": "GET - Scraping InTender Germany",
-            "/scrape/france/tenders": "GET - Scraping InTender France",
+            "/accounts": "GET - Comptes ERAC configurés",
+            "/scrape/{account}": "GET - Scraping ERAC d'un compte (avec VIN)",
+            "/scrape/{account}/tenders": "GET - Scraping InTender d'un compte",
+            "/tenders/{account}/search": "GET - Recherche dans le dernier InTender (?collection_post_code=&delivery_town=&min_distance_km=&max_distance_km=&fuel_type=&needs_trailer=&sort=&order=&page=&per_page=)",
+            "/export/{account}/missions.{csv|arrow|parquet}": "GET - Export à plat des missions enrichies",
+            "/export/{account}/tenders.{csv|arrow|parquet}": "GET - Export à plat des véhicules InTender",
+            "/profiles": "GET - Profils enregistrés (en-tête X-Erac-Profile: <PROFILE_TOKEN> pour profiler une requête)",
+            "/profiles/{id}": "GET - Résumé d'un profil (/prof pour pstats, /folded pour flamegraph)",
+            "/webhooks": "GET/POST - Webhooks de changements des missions ({url, countries}, en-tête X-Erac-Admin-Token: <WEBHOOK_ADMIN_TOKEN>)",
+            "/webhooks/{id}": "DELETE - Supprimer un webhook",
+            "/webhooks/dead-letters": "GET - Événements abandonnés après WEBHOOK_MAX_ATTEMPTS (POST /requeue pour les relancer)",
+            "/watch/{account}/run": "POST - Lancer une détection de changements immédiate",
             "/health": "GET - Status de santé",
-            "/debug/movement/{id}": "GET - Debug d'un mouvement"
+            "/debug/movement/{id}": "GET - Debug d'un mouvement (?account=, premier compte configuré par défaut)",
+            "/debug/captures": "GET - Captures debug récentes (?kind=&ref_id=)",
+            "/debug/captures/{id}": "GET - Champs extraits d'une capture (/html pour la page brute)",
+            "/archive": "GET - Pages HTML archivées (?kind=&country=&limit=)",
+            "/archive/reparse/{movement|tender}": "GET - Re-parse hors ligne des pages archivées (?country=&limit=&all=1)"
         }
     })
 
@@ -33,6 +69,974 @@ def health():
     return jsonify({"status": "healthy", "timestamp": datetime.utcnow().isoformat()})
 
 
+# ============================================================
+# PROFILING (à la demande, par requête)
+# ============================================================
+# Si PROFILE_TOKEN est défini, une requête portant l'en-tête
+#   X-Erac-Profile: <PROFILE_TOKEN>
+# est exécutée sous cProfile, avec des spans wall-clock par étape
+# (login, ajax_search, movement_fetch, movement_parse, extract_dates, jsonify...).
+# Résumé, dump pstats (.prof) et piles repliées (.folded, flamegraph.pl /
+# speedscope) sont écrits dans PROFILE_DIR ; l'id est renvoyé dans
+# l'en-tête X-Erac-Profile-Id. Les routes /profiles* exigent le même en-tête.
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/tmp/erac_profiles')
+PROFILE_TOP_FUNCTIONS = 30
+
+_profile_local = threading.local()
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class ProfileRun:
+    def __init__(self, label):
+        self.id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{os.urandom(3).hex()}"
+        self.label = label
+        self.profiler = cProfile.Profile()
+        self.spans = []
+        self._stack = []
+
+    @contextlib.contextmanager
+    def span(self, name, meta):
+        self._stack.append(name)
+        path = ';'.join(self._stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append({'name': name, 'path': path,
+                               'duration_ms': (time.perf_counter() - start) * 1000, **meta})
+            self._stack.pop()
+
+    def folded(self):
+        """Piles repliées 'a;b;c <µs>' (temps propre de chaque span)."""
+        totals, children = {}, {}
+        for sp in self.spans:
+            totals[sp['path']] = totals.get(sp['path'], 0) + sp['duration_ms']
+            parent = sp['path'].rpartition(';')[0]
+            if parent:
+                children[parent] = children.get(parent, 0) + sp['duration_ms']
+        lines = []
+        for path, total in totals.items():
+            self_us = int((total - children.get(path, 0)) * 1000)
+            if self_us > 0:
+                lines.append(f'{path} {self_us}')
+        return '\n'.join(sorted(lines)) + '\n'
+
+    def summary(self):
+        stages = {}
+        for sp in self.spans:
+            stage = stages.setdefault(sp['name'], {'count': 0, 'total_ms': 0.0})
+            stage['count'] += 1
+            stage['total_ms'] += sp['duration_ms']
+
+        stats = pstats.Stats(self.profiler).stats
+        top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+        return {
+            'id': self.id,
+            'label': self.label,
+            'stages': {name: {'count': v['count'], 'total_ms': round(v['total_ms'], 2)}
+                       for name, v in sorted(stages.items(), key=lambda kv: -kv[1]['total_ms'])},
+            'movements': [{'movement_id': sp['movement_id'], 'stage': sp['name'],
+                           'duration_ms': round(sp['duration_ms'], 2)}
+                          for sp in self.spans if 'movement_id' in sp],
+            'top_functions': [{'function': f'{fn[0]}:{fn[1]}({fn[2]})', 'ncalls': st[1],
+                               'tottime_ms': round(st[2] * 1000, 2), 'cumtime_ms': round(st[3] * 1000, 2)}
+                              for fn, st in top],
+        }
+
+    def save(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, self.id)
+        self.profiler.dump_stats(f'{base}.prof')
+        with open(f'{base}.folded', 'w', encoding='utf-8') as f:
+            f.write(self.folded())
+        summary = self.summary()
+        with open(f'{base}.json', 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False)
+        return summary
+
+
+def profile_span(name, **meta):
+    """Span wall-clock ; ne coûte qu'un getattr quand aucun profil n'est actif."""
+    run = getattr(_profile_local, 'run', None)
+    if run is None:
+        return _NULL_SPAN
+    return run.span(name, meta)
+
+
+def _profile_token_ok(token):
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+@app.before_request
+def _start_profile():
+    if not _profile_token_ok(request.headers.get('X-Erac-Profile')):
+        return
+    run = ProfileRun(request.path)
+    run.root = run.span('request', {})
+    run.root.__enter__()
+    _profile_local.run = run
+    run.profiler.enable()
+
+
+def _finish_profile(run):
+    """Ferme le span racine 'request' (après le corps s'il est streamé) puis sauvegarde."""
+    run.profiler.disable()
+    run.root.__exit__(None, None, None)
+    try:
+        run.save()
+    except Exception as e:
+        print(f"Erreur sauvegarde profil {run.id}: {str(e)}")
+
+
+class _ProfiledStream:
+    """Corps streamé (export CSV...) : le profil et le span racine 'request'
+    restent ouverts pendant la génération (stream_body est un enfant de
+    request) ; tout est clos et sauvegardé à la fermeture du corps."""
+
+    def __init__(self, run, body):
+        self.run = run
+        self.body = body
+        self.done = False
+
+    def __iter__(self):
+        _profile_local.run = self.run
+        try:
+            with self.run.span('stream_body', {}):
+                for chunk in self.body:
+                    yield chunk
+        finally:
+            _profile_local.run = None
+
+    def close(self):
+        if self.done:
+            return
+        self.done = True
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            _finish_profile(self.run)
+
+
+@app.after_request
+def _stop_profile(response):
+    run = getattr(_profile_local, 'run', None)
+    if run is None:
+        return response
+    _profile_local.run = None
+    response.headers['X-Erac-Profile-Id'] = run.id
+    if response.is_streamed:
+        # Le corps n'est généré qu'après after_request : on profile jusqu'à sa fin
+        response.response = _ProfiledStream(run, response.response)
+    else:
+        _finish_profile(run)
+    return response
+
+
+@app.teardown_request
+def _discard_profile(exc):
+    run = getattr(_profile_local, 'run', None)
+    if run is not None:
+        run.profiler.disable()
+        _profile_local.run = None
+
+
+def _profile_forbidden():
+    """Les profils exposent chemins et timings internes : même jeton (en-tête seulement, pas dans les logs)."""
+    if _profile_token_ok(request.headers.get('X-Erac-Profile')):
+        return None
+    return jsonify({'success': False, 'error': 'Jeton de profil invalide'}), 403
+
+
+def _profile_file(profile_id, ext):
+    if os.path.basename(profile_id) != profile_id:
+        return None
+    path = os.path.join(PROFILE_DIR, f'{profile_id}.{ext}')
+    return path if os.path.exists(path) else None
+
+
+@app.route('/profiles')
+def list_profiles():
+    denied = _profile_forbidden()
+    if denied:
+        return denied
+    if not os.path.isdir(PROFILE_DIR):
+        return jsonify({'success': True, 'profiles': []})
+    ids = sorted((f[:-5] for f in os.listdir(PROFILE_DIR) if f.endswith('.json')), reverse=True)
+    return jsonify({'success': True, 'profiles': ids})
+
+
+@app.route('/profiles/<profile_id>')
+def get_profile(profile_id):
+    denied = _profile_forbidden()
+    if denied:
+        return denied
+    path = _profile_file(profile_id, 'json')
+    if not path:
+        return jsonify({'success': False, 'error': 'Profil introuvable'}), 404
+    with open(path, encoding='utf-8') as f:
+        return jsonify({'success': True, 'profile': json.load(f)})
+
+
+@app.route('/profiles/<profile_id>/<fmt>')
+def download_profile(profile_id, fmt):
+    denied = _profile_forbidden()
+    if denied:
+        return denied
+    path = _profile_file(profile_id, fmt) if fmt in ('prof', 'folded') else None
+    if not path:
+        return jsonify({'success': False, 'error': 'Profil introuvable'}), 404
+    with open(path, 'rb') as f:
+        mimetype = 'text/plain' if fmt == 'folded' else 'application/octet-stream'
+        return Response(f.read(), mimetype=mimetype)
+
+
+# ============================================================
+# ARCHIVE HTML (pages mouvement / InTender)
+# ============================================================
+# Pages stockées compressées (gzip) et adressées par leur sha256 :
+#   {ARCHIVE_DIR}/ab/abcdef....html.gz
+# L'index SQLite garde une ligne par récupération (kind, ref_id, country, date)
+# et permet de re-parser hors ligne avec les extracteurs actuels.
+
+ARCHIVE_ENABLED = os.environ.get('ARCHIVE_ENABLED', 'true').lower() == 'true'
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', '/tmp/erac_archive')
+ARCHIVE_MAX_PAGES = int(os.environ.get('ARCHIVE_MAX_PAGES', 5000))
+ARCHIVE_QUEUE_SIZE = int(os.environ.get('ARCHIVE_QUEUE_SIZE', 500))
+ARCHIVE_PRUNE_EVERY = 100
+
+# Les écritures (hash, gzip, index) sont faites par un thread dédié avec une
+# connexion SQLite WAL unique ; le chemin de requête ne fait qu'un put_nowait.
+_archive_queue = queue.Queue(maxsize=ARCHIVE_QUEUE_SIZE)
+_archive_thread = None
+_archive_thread_lock = threading.Lock()
+
+
+def _archive_db():
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(ARCHIVE_DIR, 'index.db'), timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('CREATE TABLE IF NOT EXISTS pages ('
+                 'id INTEGER PRIMARY KEY AUTOINCREMENT, sha TEXT NOT NULL, kind TEXT NOT NULL, '
+                 'ref_id TEXT, country TEXT, fetched_at TEXT NOT NULL)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_pages_kind ON pages (kind, country, ref_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_pages_sha ON pages (sha)')
+    return conn
+
+
+def _archive_path(sha):
+    return os.path.join(ARCHIVE_DIR, sha[:2], f'{sha}.html.gz')
+
+
+def archive_page(kind, ref_id, country, html):
+    """Programme l'archivage d'une page brute. Ne lève jamais ; page ignorée si la file est pleine."""
+    if not ARCHIVE_ENABLED or not html:
+        return
+    _start_archive_thread()
+    try:
+        _archive_queue.put_nowait((kind, str(ref_id) if ref_id is not None else None, country.lower(),
+                                   datetime.utcnow().isoformat(), html))
+    except queue.Full:
+        print(f"Archive saturée, page ignorée: {kind} {ref_id}")
+
+
+def _start_archive_thread():
+    global _archive_thread
+    if _archive_thread is not None:
+        return
+    with _archive_thread_lock:
+        if _archive_thread is None:
+            _archive_thread = threading.Thread(target=_archive_worker, name='archive', daemon=True)
+            _archive_thread.start()
+
+
+def _archive_worker():
+    conn = None
+    inserted = 0
+    try:
+        # Workers recyclés avant ARCHIVE_PRUNE_EVERY insertions : la rétention s'applique quand même
+        conn = _archive_db()
+        _archive_prune(conn)
+    except Exception as e:
+        print(f"Erreur rétention archive: {str(e)}")
+    while True:
+        kind, ref_id, country, fetched_at, html = _archive_queue.get()
+        try:
+            if conn is None:
+                conn = _archive_db()
+            _archive_write(conn, kind, ref_id, country, fetched_at, html)
+            inserted += 1
+            if inserted % ARCHIVE_PRUNE_EVERY == 0:
+                _archive_prune(conn)
+        except Exception as e:
+            print(f"Erreur archive {kind} {ref_id}: {str(e)}")
+
+
+def _archive_write(conn, kind, ref_id, country, fetched_at, html):
+    """
+    La ligne d'index est insérée AVANT de vérifier le fichier : un prune
+    concurrent (autre worker) ne supprime que les fichiers sans ligne, dans
+    sa transaction ; on réécrit donc le fichier s'il a disparu entre-temps.
+    """
+    raw = html.encode('utf-8')
+    sha = hashlib.sha256(raw).hexdigest()
+    conn.execute('INSERT INTO pages (sha, kind, ref_id, country, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                 (sha, kind, ref_id, country, fetched_at))
+    path = _archive_path(sha)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with gzip.open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+    return sha
+
+
+def _archive_prune(conn):
+    """Rétention : ne garde que les ARCHIVE_MAX_PAGES entrées les plus récentes."""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        count = conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        excess = count - ARCHIVE_MAX_PAGES
+        if excess > 0:
+            old = conn.execute('SELECT id, sha FROM pages ORDER BY id LIMIT ?', (excess,)).fetchall()
+            conn.executemany('DELETE FROM pages WHERE id = ?', [(row[0],) for row in old])
+            for sha in {row[1] for row in old}:
+                still_used = conn.execute('SELECT 1 FROM pages WHERE sha = ? LIMIT 1', (sha,)).fetchone()
+                if not still_used:
+                    try:
+                        os.remove(_archive_path(sha))
+                    except OSError:
+                        pass
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def load_archived_page(sha):
+    with gzip.open(_archive_path(sha), 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def list_archived_pages(kind=None, country=None, latest_only=True, limit=None):
+    """
+    Liste les entrées de l'archive (plus récentes d'abord).
+    latest_only : une seule entrée par (kind, country, ref_id).
+    """
+    if not os.path.exists(os.path.join(ARCHIVE_DIR, 'index.db')):
+        return []
+    where, params = [], []
+    if kind:
+        where.append('kind = ?')
+        params.append(kind)
+    if country:
+        where.append('country = ?')
+        params.append(country.lower())
+    sql = 'SELECT id, sha, kind, ref_id, country, fetched_at FROM pages'
+    if latest_only:
+        sql += ' WHERE id IN (SELECT MAX(id) FROM pages GROUP BY kind, country, ref_id)'
+        if where:
+            sql += ' AND ' + ' AND '.join(where)
+    elif where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY id DESC'
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(int(limit))
+    conn = _archive_db()
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    return [{'id': r[0], 'sha': r[1], 'kind': r[2], 'ref_id': r[3], 'country': r[4], 'fetched_at': r[5]}
+            for r in rows]
+
+
+def reparse_archive(kind='movement', country=None, limit=None, latest_only=True):
+    """
+    Re-exécute les extracteurs actuels sur les pages archivées, sans réseau.
+    Renvoie une liste de {archive: entrée, data: résultat du parse}.
+    """
+    results = []
+    for entry in list_archived_pages(kind=kind, country=country, latest_only=latest_only, limit=limit):
+        account = ACCOUNTS.get((entry['country'] or '').lower())
+        decimal_separator = account.decimal_separator if account else ','
+        try:
+            html = load_archived_page(entry['sha'])
+        except OSError as e:
+            results.append({'archive': entry, 'data': None, 'error': str(e)})
+            continue
+        if kind == 'movement':
+            try:
+                data = parse_mission_html(html, entry['ref_id'], decimal_separator)
+            except Exception as e:
+                data = {'movement_id': entry['ref_id'], 'error': str(e)}
+        else:
+            data = parse_tender_vehicles(html, decimal_separator)
+        results.append({'archive': entry, 'data': data})
+    return results
+
+
+@app.route('/archive')
+def archive_index():
+    kind = request.args.get('kind')
+    country = request.args.get('country')
+    limit = request.args.get('limit', 100, type=int)
+    entries = list_archived_pages(kind=kind, country=country, latest_only=False, limit=limit)
+    return jsonify({'success': True, 'count': len(entries), 'entries': entries})
+
+
+@app.route('/archive/reparse/<kind>')
+def archive_reparse(kind):
+    if kind not in ('movement', 'tender'):
+        return jsonify({'success': False, 'error': f"Type inconnu: {kind}"}), 400
+    try:
+        results = reparse_archive(kind, country=request.args.get('country'),
+                                  limit=request.args.get('limit', 100, type=int),
+                                  latest_only=request.args.get('all') != '1')
+        return jsonify({'success': True, 'kind': kind, 'count': len(results), 'results': results})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ============================================================
+# DEBUG CAPTURE (échantillonnage + ring buffer + flush asynchrone)
+# ============================================================
+# DEBUG_CAPTURE_RATE : probabilité (0..1) de capturer une page récupérée.
+# Les captures (HTML brut + champs extraits) restent dans un ring buffer
+# mémoire de DEBUG_CAPTURE_SIZE entrées et sont écrites sur disque par un
+# thread dédié : le chemin de requête ne fait jamais d'I/O. La file d'écriture
+# est bornée (captures ignorées si elle est pleine) et le répertoire ne garde
+# que les DEBUG_CAPTURE_MAX_FILES captures les plus récentes.
+
+DEBUG_CAPTURE_RATE = float(os.environ.get('DEBUG_CAPTURE_RATE', 0))
+DEBUG_CAPTURE_SIZE = int(os.environ.get('DEBUG_CAPTURE_SIZE', 50))
+DEBUG_CAPTURE_DIR = os.environ.get('DEBUG_CAPTURE_DIR', '/tmp/erac_debug')
+DEBUG_CAPTURE_MAX_FILES = int(os.environ.get('DEBUG_CAPTURE_MAX_FILES', 500))
+
+_debug_captures = deque(maxlen=DEBUG_CAPTURE_SIZE)
+_debug_captures_lock = threading.Lock()
+_debug_flush_queue = queue.Queue(maxsize=DEBUG_CAPTURE_SIZE)
+_debug_flush_thread = None
+
+
+def should_capture_debug():
+    return DEBUG_CAPTURE_RATE > 0 and random.random() < DEBUG_CAPTURE_RATE
+
+
+def capture_debug_page(kind, ref_id, country, html, fields):
+    """Ajoute une capture au ring buffer et programme son écriture disque."""
+    capture = {
+        'id': f"{kind}-{ref_id}-{int(time.time() * 1000)}",
+        'kind': kind,
+        'ref_id': str(ref_id),
+        'country': country.lower(),
+        'captured_at': datetime.utcnow().isoformat(),
+        'html': html,
+        'fields': fields,
+    }
+    with _debug_captures_lock:
+        _debug_captures.append(capture)
+    if DEBUG_CAPTURE_DIR:
+        _start_debug_flush_thread()
+        try:
+            _debug_flush_queue.put_nowait(capture)
+        except queue.Full:
+            pass  # reste consultable dans le ring buffer, mais pas écrite sur disque
+    return capture['id']
+
+
+def _start_debug_flush_thread():
+    global _debug_flush_thread
+    if _debug_flush_thread is not None:
+        return
+    with _debug_captures_lock:
+        if _debug_flush_thread is None:
+            _debug_flush_thread = threading.Thread(target=_debug_flush_worker, name='debug-flush', daemon=True)
+            _debug_flush_thread.start()
+
+
+def _debug_flush_worker():
+    while True:
+        capture = _debug_flush_queue.get()
+        try:
+            os.makedirs(DEBUG_CAPTURE_DIR, exist_ok=True)
+            base = os.path.join(DEBUG_CAPTURE_DIR, capture['id'])
+            with open(f'{base}.html', 'w', encoding='utf-8') as f:
+                f.write(capture['html'])
+            meta = {k: v for k, v in capture.items() if k != 'html'}
+            with open(f'{base}.json', 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, default=str)
+            _prune_debug_dir()
+        except Exception as e:
+            print(f"Erreur flush debug {capture['id']}: {str(e)}")
+
+
+def _prune_debug_dir():
+    """Supprime les captures les plus anciennes au-delà de DEBUG_CAPTURE_MAX_FILES."""
+    entries = [e for e in os.scandir(DEBUG_CAPTURE_DIR) if e.name.endswith('.json')]
+    excess = len(entries) - DEBUG_CAPTURE_MAX_FILES
+    if excess <= 0:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[:excess]:
+        base = entry.path[:-len('.json')]
+        for ext in ('.json', '.html'):
+            try:
+                os.remove(base + ext)
+            except OSError:
+                pass
+
+
+def list_debug_captures(kind=None, ref_id=None):
+    """Captures en mémoire, plus récentes d'abord (sans le HTML)."""
+    with _debug_captures_lock:
+        captures = list(_debug_captures)
+    return [{k: v for k, v in c.items() if k != 'html'}
+            for c in reversed(captures)
+            if (kind is None or c['kind'] == kind) and (ref_id is None or c['ref_id'] == str(ref_id))]
+
+
+def get_debug_capture(capture_id):
+    """Cherche une capture dans le ring buffer, puis sur disque."""
+    with _debug_captures_lock:
+        for c in _debug_captures:
+            if c['id'] == capture_id:
+                return c
+    if not DEBUG_CAPTURE_DIR or os.path.basename(capture_id) != capture_id:
+        return None
+    base = os.path.join(DEBUG_CAPTURE_DIR, capture_id)
+    try:
+        with open(f'{base}.json', encoding='utf-8') as f:
+            capture = json.load(f)
+        with open(f'{base}.html', encoding='utf-8') as f:
+            capture['html'] = f.read()
+        return capture
+    except OSError:
+        return None
+
+
+@app.route('/debug/captures')
+def debug_captures():
+    captures = list_debug_captures(kind=request.args.get('kind'), ref_id=request.args.get('ref_id'))
+    return jsonify({'success': True, 'sampling_rate': DEBUG_CAPTURE_RATE,
+                    'count': len(captures), 'captures': captures})
+
+
+@app.route('/debug/captures/<capture_id>')
+def debug_capture(capture_id):
+    capture = get_debug_capture(capture_id)
+    if not capture:
+        return jsonify({'success': False, 'error': 'Capture introuvable'}), 404
+    return jsonify({'success': True, 'capture': {k: v for k, v in capture.items() if k != 'html'}})
+
+
+@app.route('/debug/captures/<capture_id>/html')
+def debug_capture_html(capture_id):
+    capture = get_debug_capture(capture_id)
+    if not capture:
+        return jsonify({'success': False, 'error': 'Capture introuvable'}), 404
+    return Response(capture['html'], mimetype='text/html')
+
+
+# ============================================================
+# ETAT PARTAGE ENTRE WORKERS (SQLite WAL)
+# ============================================================
+# Cache clé/valeur JSON avec TTL + verrous nommés avec expiration, dans un
+# fichier SQLite local partagé par tous les workers :
+#   scrape:{namespace}:{enriched|listing}, intender:{namespace}  → résultats
+#   intender_latest:{namespace}, intender_latest_ts:{namespace}  → dernier InTender (index de recherche)
+#   movement:{namespace}:{id}                                    → détails mouvement
+#   session:{namespace}                                          → cookies ERAC
+# (namespace = cache_namespace du compte ERAC)
+# Un seul worker à la fois rafraîchit une clé donnée (shared_cached) : son
+# verrou (bail SHARED_LOCK_TTL) est prolongé tant que le scraping tourne, et les
+# autres attendent son résultat jusqu'à SHARED_LOCK_WAIT secondes.
+# SHARED_STATE_PATH vide → pas de partage (chaque appel scrape).
+
+SHARED_STATE_PATH = os.environ.get('SHARED_STATE_PATH', '/tmp/erac_shared.db')
+SCRAPE_CACHE_TTL = int(os.environ.get('SCRAPE_CACHE_TTL', 60))
+MOVEMENT_CACHE_TTL = int(os.environ.get('MOVEMENT_CACHE_TTL', 600))
+SESSION_COOKIE_TTL = int(os.environ.get('SESSION_COOKIE_TTL', 900))
+SHARED_LOCK_TTL = int(os.environ.get('SHARED_LOCK_TTL', 60))
+SHARED_LOCK_WAIT = int(os.environ.get('SHARED_LOCK_WAIT', 900))
+SHARED_POLL_INTERVAL = 0.5
+
+_shared_local = threading.local()
+
+
+def _shared_db():
+    conn = getattr(_shared_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(SHARED_STATE_PATH, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS rate_slots (name TEXT PRIMARY KEY, next_slot REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS webhooks (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, '
+                     'countries TEXT NOT NULL, created_at TEXT NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS webhook_outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                     'webhook_id INTEGER NOT NULL, payload TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, '
+                     'next_attempt_at REAL NOT NULL, last_error TEXT, status TEXT NOT NULL DEFAULT \'pending\')')
+        try:
+            conn.execute("ALTER TABLE webhook_outbox ADD COLUMN status TEXT NOT NULL DEFAULT 'pending'")
+        except sqlite3.OperationalError:
+            pass  # colonne déjà présente
+        _shared_local.conn = conn
+    return conn
+
+
+def shared_cache_get(key):
+    if not SHARED_STATE_PATH:
+        return None
+    row = _shared_db().execute('SELECT value FROM cache WHERE key = ? AND expires_at > ?',
+                               (key, time.time())).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def shared_cache_set(key, value, ttl):
+    if not SHARED_STATE_PATH or ttl <= 0:
+        return
+    now = time.time()
+    conn = _shared_db()
+    conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                 (key, json.dumps(value, ensure_ascii=False, default=str), now + ttl))
+    conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+
+
+def shared_cache_delete(key):
+    if SHARED_STATE_PATH:
+        _shared_db().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+
+def acquire_shared_lock(name, ttl=SHARED_LOCK_TTL):
+    """Verrou inter-process non bloquant. Renvoie un jeton propriétaire ou None."""
+    if not SHARED_STATE_PATH:
+        return 'local'
+    owner = f'{os.getpid()}-{threading.get_ident()}-{os.urandom(4).hex()}'
+    now = time.time()
+    conn = _shared_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM locks WHERE name = ? AND expires_at <= ?', (name, now))
+        cur = conn.execute('INSERT OR IGNORE INTO locks (name, owner, expires_at) VALUES (?, ?, ?)',
+                           (name, owner, now + ttl))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return owner if cur.rowcount == 1 else None
+
+
+def release_shared_lock(name, owner):
+    with _renewed_locks_lock:
+        _renewed_locks.pop((name, owner), None)
+    if SHARED_STATE_PATH:
+        _shared_db().execute('DELETE FROM locks WHERE name = ? AND owner = ?', (name, owner))
+
+
+# Verrous prolongés tant que leur détenteur est vivant : un thread unique repousse
+# leur expiration toutes les SHARED_LOCK_RENEW_INTERVAL secondes. Si le process
+# meurt, le verrou expire après son ttl au lieu de rester pris.
+SHARED_LOCK_RENEW_INTERVAL = 10
+
+_renewed_locks = {}
+_renewed_locks_lock = threading.Lock()
+_lock_renew_thread = None
+
+
+def keep_shared_lock_alive(name, owner, ttl):
+    """Prolonge le verrou (ttl > SHARED_LOCK_RENEW_INTERVAL) jusqu'à release_shared_lock."""
+    global _lock_renew_thread
+    if not SHARED_STATE_PATH:
+        return
+    with _renewed_locks_lock:
+        _renewed_locks[(name, owner)] = ttl
+        if _lock_renew_thread is None:
+            _lock_renew_thread = threading.Thread(target=_lock_renew_loop, name='lock-renew', daemon=True)
+            _lock_renew_thread.start()
+
+
+def _lock_renew_loop():
+    while True:
+        time.sleep(SHARED_LOCK_RENEW_INTERVAL)
+        with _renewed_locks_lock:
+            held = list(_renewed_locks.items())
+        if not held:
+            continue
+        try:
+            now = time.time()
+            conn = _shared_db()
+            for (name, owner), ttl in held:
+                cur = conn.execute('UPDATE locks SET expires_at = ? WHERE name = ? AND owner = ?',
+                                   (now + ttl, name, owner))
+                if cur.rowcount == 0:
+                    print(f"Verrou perdu avant sa libération: {name}")
+                    with _renewed_locks_lock:
+                        _renewed_locks.pop((name, owner), None)
+        except Exception as e:
+            print(f"Erreur renouvellement verrous: {str(e)}")
+
+
+def reserve_shared_rate_slot(name, interval):
+    """
+    Réserve le prochain créneau d'un limiteur de débit commun à tous les workers.
+    Renvoie l'heure (time.time()) à laquelle la requête peut partir.
+    """
+    now = time.time()
+    conn = _shared_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT next_slot FROM rate_slots WHERE name = ?', (name,)).fetchone()
+        slot = max(now, row[0] if row else 0.0)
+        conn.execute('INSERT OR REPLACE INTO rate_slots (name, next_slot) VALUES (?, ?)', (name, slot + interval))
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return slot
+
+
+def acquire_shared_slot(name, limit, ttl, wait, poll=0.05, max_poll=1.0):
+    """
+    Sémaphore inter-process à `limit` places (une place = un verrou nommé
+    {name}#{i}, prolongé jusqu'à sa libération). Attend au plus `wait`
+    secondes (back-off exponentiel) ; renvoie (nom, jeton) ou lève TimeoutError.
+    Les places sont d'abord lues sans verrou : une seule transaction d'écriture,
+    et seulement quand une place semble libre.
+    """
+    slot_names = [f'{name}#{i}' for i in range(limit)]
+    placeholders = ','.join('?' * limit)
+    conn = _shared_db()
+    deadline = time.time() + wait
+    while True:
+        now = time.time()
+        held = {r[0] for r in conn.execute(f'SELECT name FROM locks WHERE name IN ({placeholders}) '
+                                           'AND expires_at > ?', (*slot_names, now))}
+        if len(held) < limit:
+            owner = f'{os.getpid()}-{threading.get_ident()}-{os.urandom(4).hex()}'
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(f'DELETE FROM locks WHERE name IN ({placeholders}) AND expires_at <= ?',
+                             (*slot_names, now))
+                held = {r[0] for r in conn.execute(f'SELECT name FROM locks WHERE name IN ({placeholders})',
+                                                   slot_names)}
+                slot_name = next((n for n in slot_names if n not in held), None)
+                if slot_name:
+                    conn.execute('INSERT INTO locks (name, owner, expires_at) VALUES (?, ?, ?)',
+                                 (slot_name, owner, now + ttl))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            if slot_name:
+                keep_shared_lock_alive(slot_name, owner, ttl)
+                return slot_name, owner
+        if now >= deadline:
+            raise TimeoutError(f"Aucune place libre pour {name} après {wait}s")
+        time.sleep(min(poll, max(deadline - now, 0)) * random.uniform(0.5, 1.0))
+        poll = min(poll * 2, max_poll)
+
+
+def shared_cached(key, ttl, producer, wait=SHARED_LOCK_WAIT, cacheable=None):
+    """
+    Renvoie la valeur partagée de `key`, sinon la produit sous verrou (prolongé
+    pendant toute la production). Les autres workers attendent le résultat au
+    lieu de scraper en parallèle ; si le producteur meurt, son verrou expire et
+    l'un d'eux reprend. Au-delà de `wait` secondes : TimeoutError (jamais de
+    production en double). Une valeur refusée par `cacheable` est renvoyée sans
+    être partagée.
+    """
+    if not SHARED_STATE_PATH or ttl <= 0:
+        return producer()
+    value = shared_cache_get(key)
+    if value is not None:
+        return value
+
+    deadline = time.time() + wait
+    while True:
+        owner = acquire_shared_lock(key)
+        if owner:
+            keep_shared_lock_alive(key, owner, SHARED_LOCK_TTL)
+            try:
+                value = shared_cache_get(key)
+                if value is None:
+                    value = producer()
+                    if cacheable is None or cacheable(value):
+                        shared_cache_set(key, value, ttl)
+                return value
+            finally:
+                release_shared_lock(key, owner)
+        if time.time() >= deadline:
+            raise TimeoutError(f"{key} toujours en cours sur un autre worker après {wait}s")
+        time.sleep(SHARED_POLL_INTERVAL)
+        value = shared_cache_get(key)
+        if value is not None:
+            return value
+
+
+# ============================================================
+# COMPTES ERAC (registre configurable)
+# ============================================================
+# ERAC_ACCOUNTS (JSON) ou ERAC_ACCOUNTS_FILE (chemin d'un fichier JSON) :
+#   {"germany": {"login_env": "ERAC_GERMANY_LOGIN", "password_env": "ERAC_GERMANY_PASSWORD",
+#                "rate_limit": 5, "concurrency": 4, "pool_size": 2, "cache_namespace": "germany",
+#                "decimal_separator": ","}}
+# Chaque compte a son pool de sessions HTTP, sa limite de débit (requêtes/s
+# vers ERAC, 0 = illimité), son plafond de requêtes simultanées et son
+# espace de noms dans l'état partagé. Débit et concurrence sont des budgets
+# globaux au compte, partagés par tous les workers via l'état SQLite ; sans
+# SHARED_STATE_PATH ils ne s'appliquent qu'au process courant. Chaque requête
+# ERAC a un timeout de ACCOUNT_REQUEST_TIMEOUT secondes (par lecture). Une
+# place de concurrence est prolongée tant que la requête dure (bail de
+# ACCOUNT_SLOT_LEASE secondes si le worker meurt) ; on attend une place au plus
+# ACCOUNT_SLOT_WAIT secondes avant d'abandonner la requête (TimeoutError).
+# decimal_separator (',' par défaut)
+# sert à lire les montants de l'export. Sans configuration : france + germany
+# avec les variables ERAC_*_LOGIN/PASSWORD historiques.
+
+ACCOUNT_REQUEST_TIMEOUT = int(os.environ.get('ACCOUNT_REQUEST_TIMEOUT', 120))
+ACCOUNT_SLOT_LEASE = int(os.environ.get('ACCOUNT_SLOT_LEASE', 60))
+ACCOUNT_SLOT_WAIT = int(os.environ.get('ACCOUNT_SLOT_WAIT', 300))
+
+ERAC_ACCOUNTS_DEFAULT = {
+    'france': {'login_env': 'ERAC_FRANCE_LOGIN', 'password_env': 'ERAC_FRANCE_PASSWORD'},
+    'germany': {'login_env': 'ERAC_GERMANY_LOGIN', 'password_env': 'ERAC_GERMANY_PASSWORD'},
+}
+
+
+class EracAccount:
+    def __init__(self, name, config):
+        self.name = name.lower()
+        self.login_env = config.get('login_env', f'ERAC_{name.upper()}_LOGIN')
+        self.password_env = config.get('password_env', f'ERAC_{name.upper()}_PASSWORD')
+        self.rate_limit = float(config.get('rate_limit', 5))
+        self.concurrency = int(config.get('concurrency', 4))
+        self.pool_size = int(config.get('pool_size', 2))
+        self.cache_namespace = config.get('cache_namespace', self.name)
+        self.decimal_separator = config.get('decimal_separator', ',')
+
+        self._semaphore = threading.BoundedSemaphore(self.concurrency)
+        self._rate_lock = threading.Lock()
+        self._next_slot = 0.0
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+
+    def credentials(self):
+        login_id = os.getenv(self.login_env)
+        password = os.getenv(self.password_env)
+        if not login_id or not password:
+            raise ValueError(f"Env vars manquantes pour {self.name.upper()}")
+        return login_id, password
+
+    def throttle(self):
+        """Espace les requêtes du compte (tous workers confondus) de 1/rate_limit secondes."""
+        if self.rate_limit <= 0:
+            return
+        if SHARED_STATE_PATH:
+            now = time.time()
+            slot = reserve_shared_rate_slot(f'rate:{self.cache_namespace}', 1 / self.rate_limit)
+        else:
+            with self._rate_lock:
+                now = time.monotonic()
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + 1 / self.rate_limit
+        if slot > now:
+            with profile_span('rate_limit'):
+                time.sleep(slot - now)
+
+    @contextlib.contextmanager
+    def concurrency_slot(self):
+        """Une des `concurrency` places du compte, partagées entre workers."""
+        if not SHARED_STATE_PATH:
+            if not self._semaphore.acquire(timeout=ACCOUNT_SLOT_WAIT):
+                raise TimeoutError(f"Aucune place libre pour {self.name} après {ACCOUNT_SLOT_WAIT}s")
+            try:
+                yield
+            finally:
+                self._semaphore.release()
+            return
+        with profile_span('concurrency_wait'):
+            slot_name, owner = acquire_shared_slot(f'concurrency:{self.cache_namespace}',
+                                                   self.concurrency, ACCOUNT_SLOT_LEASE, ACCOUNT_SLOT_WAIT)
+        try:
+            yield
+        finally:
+            release_shared_lock(slot_name, owner)
+
+    def checkout_session(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return AccountSession(self)
+
+    def release_session(self, session):
+        try:
+            self._pool.put_nowait(session)
+        except queue.Full:
+            session.close()
+
+    def describe(self):
+        return {'name': self.name, 'rate_limit': self.rate_limit, 'concurrency': self.concurrency,
+                'pool_size': self.pool_size, 'cache_namespace': self.cache_namespace,
+                'decimal_separator': self.decimal_separator,
+                'configured': bool(os.getenv(self.login_env) and os.getenv(self.password_env))}
+
+
+class AccountSession(requests.Session):
+    """Session dont chaque requête respecte la limite de débit et de concurrence du compte."""
+
+    def __init__(self, account):
+        super().__init__()
+        self.account = account
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault('timeout', ACCOUNT_REQUEST_TIMEOUT)
+        self.account.throttle()
+        with self.account.concurrency_slot():
+            return super().request(method, url, *args, **kwargs)
+
+
+def _load_accounts():
+    path = os.environ.get('ERAC_ACCOUNTS_FILE')
+    raw = os.environ.get('ERAC_ACCOUNTS')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+    elif raw:
+        config = json.loads(raw)
+    else:
+        config = ERAC_ACCOUNTS_DEFAULT
+    return {name.lower(): EracAccount(name, cfg) for name, cfg in config.items()}
+
+
+ACCOUNTS = _load_accounts()
+
+
+def get_account(name):
+    account = ACCOUNTS.get(name.lower())
+    if account is None:
+        raise ValueError(f"Compte inconnu: {name}")
+    return account
+
+
+def cache_namespace(name):
+    return get_account(name).cache_namespace
+
+
+def _unknown_account(name):
+    return jsonify({'success': False, 'error': f"Compte inconnu: {name}", 'accounts': sorted(ACCOUNTS)}), 404
+
+
+@app.route('/accounts')
+def list_accounts():
+    return jsonify({'success': True, 'accounts': [a.describe() for a in ACCOUNTS.values()]})
+
+
 # ============================================================
 # MISSIONS (INBOUND/OUTBOUND)
 # ============================================================
@@ -202,6 +1206,9 @@ def _extract_date_field(soup, input_ids, label_keys):
     return None
 
 
+SESSION_EXPIRED_ERROR = 'Session expiree'
+
+
 def get_mission_details(session, movement_id, country="france", headers=None, debug=False):
     try:
         movement_url = f'https://erac.hkremarketing.com/movement/{movement_id}'
@@ -211,169 +1218,196 @@ def get_mission_details(session, movement_id, country="france", headers=None, de
                 'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
             }
 
-        response = session.get(movement_url, headers=headers)
+        with profile_span('movement_fetch', movement_id=movement_id):
+            response = session.get(movement_url, headers=headers)
 
         if response.status_code != 200:
             return {'movement_id': movement_id, 'error': f'HTTP {response.status_code}'}
 
-        soup = BeautifulSoup(response.text, 'html.parser')
+        if _is_login_page(response.text):
+            # Session ERAC terminée : ERAC renvoie la page de login en 200.
+            # Ne pas la parser ni la mettre en cache ; les cookies partagés sont invalidés.
+            invalidate_erac_session(country)
+            return {'movement_id': movement_id, 'error': SESSION_EXPIRED_ERROR}
 
-        if debug:
-            try:
-                with open(f'/tmp/movement_debug_{movement_id}.html', 'w', encoding='utf-8') as f:
-                    f.write(response.text)
-                print(f"HTML sauvegardé: /tmp/movement_debug_{movement_id}.html")
-            except:
-                pass
+        archive_page('movement', movement_id, country, response.text)
 
-        movement_data = {
-            'movement_id': movement_id,
-            'vin': None,
-            'make_model': None,
-            'registration': None,
-            'unit_no': None,
-            'fuel_type': None,
-            'route_estimate': None,
-            'route_distance_km': None,
-            'route_duration': None,
-            'collection_date': None,
-            'delivery_date': None,
-            'collection_address': None,
-            'delivery_address': None,
-            'collection_address_full': {'name': None, 'address': None, 'tel': None, 'email': None, 'special_instructions': None},
-            'delivery_address_full': {'name': None, 'address': None, 'tel': None, 'email': None, 'special_instructions': None},
-            'status': None,
-            'delivery_charge': None,
-            'error': None
-        }
+        with profile_span('movement_parse', movement_id=movement_id):
+            movement_data = parse_mission_html(response.text, movement_id, get_account(country).decimal_separator)
 
-        # ======================================================
-        # VIN — 5 fallbacks
-        # ======================================================
-        # 1. label.control-label contenant VIN → p.form-control-static
-        for label in soup.find_all('label', class_='control-label'):
-            if 'VIN' in label.get_text().upper():
-                elem = label.parent.find('p', class_='form-control-static')
-                if elem:
-                    movement_data['vin'] = elem.get_text().strip()
-                    break
+        if debug or should_capture_debug():
+            capture_debug_page('movement', movement_id, country, response.text, movement_data)
 
-        # 2. N'importe quel label contenant VIN → next p.form-control-static
-        if not movement_data['vin']:
-            for label in soup.find_all('label'):
-                if 'VIN' in label.get_text().strip().upper():
-                    elem = label.find_next('p', class_='form-control-static')
-                    if elem:
-                        movement_data['vin'] = elem.get_text().strip()
-                        break
+        shared_cache_set(f'movement:{cache_namespace(country)}:{movement_id}', movement_data, MOVEMENT_CACHE_TTL)
+        return movement_data
+
+    except Exception as e:
+        return {'movement_id': movement_id, 'error': str(e)}
 
-        # 3. p.form-control-static dont le contenu ressemble à un VIN (17 chars)
-        if not movement_data['vin']:
-            for elem in soup.find_all('p', class_='form-control-static'):
-                text = elem.get_text().strip().upper()
-                if len(text) == 17 and text[0] in 'ZWVJLMRSTUX123456789':
-                    movement_data['vin'] = text
+
+def _is_login_page(html):
+    """Page de login ERAC (champ LoginId) sans formulaire de mouvement."""
+    return 'LoginId' in html and 'form-control-static' not in html and 'RegNo' not in html
+
+
+def parse_mission_html(html, movement_id, decimal_separator=','):
+    """
+    Extrait les champs d'une page mouvement (sans réseau).
+    Utilisé par get_mission_details et par le re-parse des pages archivées.
+    decimal_separator : locale du compte, pour la distance ('1.234,5 km').
+    """
+    with profile_span('soup_parse'):
+        soup = BeautifulSoup(html, 'html.parser')
+
+    movement_data = {
+        'movement_id': movement_id,
+        'vin': None,
+        'make_model': None,
+        'registration': None,
+        'unit_no': None,
+        'fuel_type': None,
+        'route_estimate': None,
+        'route_distance_km': None,
+        'route_duration': None,
+        'collection_date': None,
+        'delivery_date': None,
+        'collection_address': None,
+        'delivery_address': None,
+        'collection_address_full': {'name': None, 'address': None, 'tel': None, 'email': None, 'special_instructions': None},
+        'delivery_address_full': {'name': None, 'address': None, 'tel': None, 'email': None, 'special_instructions': None},
+        'status': None,
+        'delivery_charge': None,
+        'error': None
+    }
+
+    # ======================================================
+    # VIN — 5 fallbacks
+    # ======================================================
+    # 1. label.control-label contenant VIN → p.form-control-static
+    for label in soup.find_all('label', class_='control-label'):
+        if 'VIN' in label.get_text().upper():
+            elem = label.parent.find('p', class_='form-control-static')
+            if elem:
+                movement_data['vin'] = elem.get_text().strip()
+                break
+
+    # 2. N'importe quel label contenant VIN → next p.form-control-static
+    if not movement_data['vin']:
+        for label in soup.find_all('label'):
+            if 'VIN' in label.get_text().strip().upper():
+                elem = label.find_next('p', class_='form-control-static')
+                if elem:
+                    movement_data['vin'] = elem.get_text().strip()
                     break
 
-        # 4. input id/name Vin
-        if not movement_data['vin']:
-            el = soup.find('input', {'id': 'Vin'}) or soup.find('input', {'name': 'Vin'})
-            if el:
-                movement_data['vin'] = el.get('value', '').strip()
-
-        # 5. Regex VIN dans le texte brut
-        if not movement_data['vin']:
-            vin_match = re.search(r'\b([A-HJ-NPR-Z0-9]{17})\b', soup.get_text())
-            if vin_match:
-                movement_data['vin'] = vin_match.group(1)
-
-        # ======================================================
-        # REGISTRATION
-        # ======================================================
-        el = soup.find('input', {'id': 'RegNo'}) or soup.find('input', {'name': 'RegNo'})
+    # 3. p.form-control-static dont le contenu ressemble à un VIN (17 chars)
+    if not movement_data['vin']:
+        for elem in soup.find_all('p', class_='form-control-static'):
+            text = elem.get_text().strip().upper()
+            if len(text) == 17 and text[0] in 'ZWVJLMRSTUX123456789':
+                movement_data['vin'] = text
+                break
+
+    # 4. input id/name Vin
+    if not movement_data['vin']:
+        el = soup.find('input', {'id': 'Vin'}) or soup.find('input', {'name': 'Vin'})
         if el:
-            movement_data['registration'] = el.get('value', '').strip()
-        else:
-            for label in soup.find_all('label'):
-                if any(k in label.get_text() for k in KEYS['registration']):
-                    elem = label.parent.find('p', class_='form-control-static')
-                    if elem:
-                        movement_data['registration'] = elem.get_text().strip()
-                        break
+            movement_data['vin'] = el.get('value', '').strip()
+
+    # 5. Regex VIN dans le texte brut
+    if not movement_data['vin']:
+        vin_match = re.search(r'\b([A-HJ-NPR-Z0-9]{17})\b', soup.get_text())
+        if vin_match:
+            movement_data['vin'] = vin_match.group(1)
+
+    # ======================================================
+    # REGISTRATION
+    # ======================================================
+    el = soup.find('input', {'id': 'RegNo'}) or soup.find('input', {'name': 'RegNo'})
+    if el:
+        movement_data['registration'] = el.get('value', '').strip()
+    else:
+        for label in soup.find_all('label'):
+            if any(k in label.get_text() for k in KEYS['registration']):
+                elem = label.parent.find('p', class_='form-control-static')
+                if elem:
+                    movement_data['registration'] = elem.get_text().strip()
+                    break
 
-        # ======================================================
-        # MAKE/MODEL
-        # ======================================================
-        el = soup.find('input', {'id': 'MakeModel'}) or soup.find('input', {'name': 'MakeModel'})
-        if el:
-            movement_data['make_model'] = el.get('value', '').strip()
-        else:
-            for label in soup.find_all('label'):
-                if any(k in label.get_text() for k in KEYS['make_model']):
-                    elem = label.parent.find('p', class_='form-control-static')
-                    if elem:
-                        movement_data['make_model'] = elem.get_text().strip()
-                        break
+    # ======================================================
+    # MAKE/MODEL
+    # ======================================================
+    el = soup.find('input', {'id': 'MakeModel'}) or soup.find('input', {'name': 'MakeModel'})
+    if el:
+        movement_data['make_model'] = el.get('value', '').strip()
+    else:
+        for label in soup.find_all('label'):
+            if any(k in label.get_text() for k in KEYS['make_model']):
+                elem = label.parent.find('p', class_='form-control-static')
+                if elem:
+                    movement_data['make_model'] = elem.get_text().strip()
+                    break
 
-        # ======================================================
-        # FUEL TYPE — FR/EN
-        # ======================================================
-        el = soup.find('input', {'id': 'FuelType'}) or soup.find('input', {'name': 'FuelType'})
-        if el:
-            movement_data['fuel_type'] = el.get('value', '').strip()
-        else:
-            sel = soup.find('select', {'id': 'FuelType'}) or soup.find('select', {'name': 'FuelType'})
-            if sel:
-                selected = sel.find('option', selected=True)
-                if selected:
-                    movement_data['fuel_type'] = selected.get_text().strip()
-            else:
-                for label in soup.find_all('label'):
-                    if any(k in label.get_text() for k in KEYS['fuel']):
-                        elem = label.parent.find('p', class_='form-control-static') or label.parent.find('span')
-                        if elem:
-                            movement_data['fuel_type'] = elem.get_text().strip()
-                            break
-
-        # ======================================================
-        # ROUTE ESTIMATE
-        # ======================================================
-        el = soup.find('input', {'id': 'RouteEstimate'}) or soup.find('input', {'name': 'RouteEstimate'})
-        if el:
-            movement_data['route_estimate'] = el.get('value', '').strip()
+    # ======================================================
+    # FUEL TYPE — FR/EN
+    # ======================================================
+    el = soup.find('input', {'id': 'FuelType'}) or soup.find('input', {'name': 'FuelType'})
+    if el:
+        movement_data['fuel_type'] = el.get('value', '').strip()
+    else:
+        sel = soup.find('select', {'id': 'FuelType'}) or soup.find('select', {'name': 'FuelType'})
+        if sel:
+            selected = sel.find('option', selected=True)
+            if selected:
+                movement_data['fuel_type'] = selected.get_text().strip()
         else:
             for label in soup.find_all('label'):
-                if any(k in label.get_text() for k in KEYS['route']):
+                if any(k in label.get_text() for k in KEYS['fuel']):
                     elem = label.parent.find('p', class_='form-control-static') or label.parent.find('span')
                     if elem:
-                        movement_data['route_estimate'] = elem.get_text().strip()
+                        movement_data['fuel_type'] = elem.get_text().strip()
                         break
 
-        if movement_data['route_estimate']:
-            dist_m = re.search(r'([\d,\.]+)\s*km', movement_data['route_estimate'])
-            if dist_m:
-                movement_data['route_distance_km'] = float(dist_m.group(1).replace(',', '.'))
-            dur_m = re.search(r'(\d+h\s*\d*m?)', movement_data['route_estimate'])
-            if dur_m:
-                movement_data['route_duration'] = dur_m.group(1).strip()
-
-        # ======================================================
-        # UNIT NO
-        # ======================================================
-        el = soup.find('input', {'id': 'UnitNo'}) or soup.find('input', {'name': 'UnitNo'})
-        if el:
-            movement_data['unit_no'] = el.get('value', '').strip()
-        else:
-            for label in soup.find_all('label'):
-                if any(k in label.get_text() for k in KEYS['unit']):
-                    elem = label.parent.find('p', class_='form-control-static')
-                    if elem:
-                        movement_data['unit_no'] = elem.get_text().strip()
-                        break
+    # ======================================================
+    # ROUTE ESTIMATE
+    # ======================================================
+    el = soup.find('input', {'id': 'RouteEstimate'}) or soup.find('input', {'name': 'RouteEstimate'})
+    if el:
+        movement_data['route_estimate'] = el.get('value', '').strip()
+    else:
+        for label in soup.find_all('label'):
+            if any(k in label.get_text() for k in KEYS['route']):
+                elem = label.parent.find('p', class_='form-control-static') or label.parent.find('span')
+                if elem:
+                    movement_data['route_estimate'] = elem.get_text().strip()
+                    break
+
+    if movement_data['route_estimate']:
+        dist_m = re.search(r'([\d,\.]+)\s*km', movement_data['route_estimate'])
+        if dist_m:
+            movement_data['route_distance_km'] = _parse_float(dist_m.group(1), decimal_separator)
+        dur_m = re.search(r'(\d+h\s*\d*m?)', movement_data['route_estimate'])
+        if dur_m:
+            movement_data['route_duration'] = dur_m.group(1).strip()
+
+    # ======================================================
+    # UNIT NO
+    # ======================================================
+    el = soup.find('input', {'id': 'UnitNo'}) or soup.find('input', {'name': 'UnitNo'})
+    if el:
+        movement_data['unit_no'] = el.get('value', '').strip()
+    else:
+        for label in soup.find_all('label'):
+            if any(k in label.get_text() for k in KEYS['unit']):
+                elem = label.parent.find('p', class_='form-control-static')
+                if elem:
+                    movement_data['unit_no'] = elem.get_text().strip()
+                    break
 
-        # ======================================================
-        # DATES — FR/EN
-        # ======================================================
+    # ======================================================
+    # DATES — FR/EN
+    # ======================================================
+    with profile_span('extract_dates'):
         movement_data['collection_date'] = _extract_date_field(
             soup,
             input_ids=['CollectionDate'],
@@ -385,41 +1419,35 @@ def get_mission_details(session, movement_id, country="france", headers=None, de
             label_keys=KEYS['delivery_date']
         )
 
-        # ======================================================
-        # ADRESSES — FR/EN via heading bilingue
-        # ======================================================
-        coll_heading = _find_heading(soup, KEYS['collection_address'])
-        movement_data['collection_address_full'] = _parse_address_section(coll_heading)
+    # ======================================================
+    # ADRESSES — FR/EN via heading bilingue
+    # ======================================================
+    coll_heading = _find_heading(soup, KEYS['collection_address'])
+    movement_data['collection_address_full'] = _parse_address_section(coll_heading)
 
-        deliv_heading = _find_heading(soup, KEYS['delivery_address'])
-        movement_data['delivery_address_full'] = _parse_address_section(deliv_heading)
+    deliv_heading = _find_heading(soup, KEYS['delivery_address'])
+    movement_data['delivery_address_full'] = _parse_address_section(deliv_heading)
 
-        # Champs plats pour compatibilité
-        movement_data['collection_address'] = movement_data['collection_address_full'].get('address')
-        movement_data['delivery_address'] = movement_data['delivery_address_full'].get('address')
+    # Champs plats pour compatibilité
+    movement_data['collection_address'] = movement_data['collection_address_full'].get('address')
+    movement_data['delivery_address'] = movement_data['delivery_address_full'].get('address')
 
-        # ======================================================
-        # DELIVERY CHARGE
-        # ======================================================
-        el = soup.find('input', {'id': 'DeliveryCharge'}) or soup.find('input', {'name': 'DeliveryCharge'})
-        if el:
-            movement_data['delivery_charge'] = el.get('value', '').strip()
+    # ======================================================
+    # DELIVERY CHARGE
+    # ======================================================
+    el = soup.find('input', {'id': 'DeliveryCharge'}) or soup.find('input', {'name': 'DeliveryCharge'})
+    if el:
+        movement_data['delivery_charge'] = el.get('value', '').strip()
 
-        if debug:
-            print(f"  VIN:      {movement_data['vin']}")
-            print(f"  Fuel:     {movement_data['fuel_type']}")
-            print(f"  CollDate: {movement_data['collection_date']}")
-            print(f"  DelDate:  {movement_data['delivery_date']}")
-            print(f"  CollAddr: {movement_data['collection_address_full']}")
-            print(f"  DelAddr:  {movement_data['delivery_address_full']}")
+    return movement_data
 
-        return movement_data
 
-    except Exception as e:
-        return {'movement_id': movement_id, 'error': str(e)}
-
-
-def enrich_missions_with_details(session, missions, country="france", headers=None, delay=0.3):
+def enrich_missions_with_details(session, missions, country="france", headers=None, delay=0.3, relogin=None):
+    """
+    relogin : callable renvoyant une session reconnectée (l'appelant reste
+    propriétaire des sessions). Si les cookies expirent en cours de route, le
+    mouvement est retenté une fois avec la nouvelle session.
+    """
     enriched = []
     total = len(missions)
     for idx, mission in enumerate(missions):
@@ -427,8 +1455,15 @@ def enrich_missions_with_details(session, missions, country="france", headers=No
         print(f"[{percent}%] {idx+1}/{total} - {mission.get('RegNo', 'N/A')}")
 
         movement_id = mission.get('Id')
+        fetched = False
         if movement_id:
-            details = get_mission_details(session, movement_id, country, headers, debug=(idx == 0))
+            details = shared_cache_get(f'movement:{cache_namespace(country)}:{movement_id}')
+            if details is None:
+                details = get_mission_details(session, movement_id, country, headers)
+                if details.get('error') == SESSION_EXPIRED_ERROR and relogin is not None:
+                    session = relogin()
+                    details = get_mission_details(session, movement_id, country, headers)
+                fetched = True
             enriched_mission = {**mission, **details}
             if details.get('vin'):        print(f"     VIN:  {details['vin']}")
             if details.get('fuel_type'):  print(f"     Fuel: {details['fuel_type']}")
@@ -437,62 +1472,34 @@ def enrich_missions_with_details(session, missions, country="france", headers=No
             enriched_mission = mission
 
         enriched.append(enriched_mission)
-        if idx < total - 1:
-            time.sleep(delay)
+        if fetched and idx < total - 1:
+            with profile_span('delay'):
+                time.sleep(delay)
 
     print(f"Enrichissement termine: {total} missions")
     return enriched
 
 
-def scrape_erac_country(country="france", enrich_details=True):
-    try:
-        print(f"Debut scraping ERAC {country.upper()}...")
+def scrape_erac_country(country="france", enrich_details=True, use_cache=True):
+    """Résultat partagé entre workers pendant SCRAPE_CACHE_TTL secondes."""
+    if not use_cache:
+        return _scrape_erac_country(country, enrich_details)
+    key = f"scrape:{cache_namespace(country)}:{'enriched' if enrich_details else 'listing'}"
+    return shared_cached(key, SCRAPE_CACHE_TTL, lambda: _scrape_erac_country(country, enrich_details),
+                         cacheable=lambda result: not _has_session_errors(result))
 
-        if country.lower() == "germany":
-            login_id = os.getenv('ERAC_GERMANY_LOGIN')
-            password = os.getenv('ERAC_GERMANY_PASSWORD')
-        else:
-            login_id = os.getenv('ERAC_FRANCE_LOGIN')
-            password = os.getenv('ERAC_FRANCE_PASSWORD')
 
-        if not login_id or not password:
-            raise ValueError(f"Variables d'env manquantes pour {country.upper()}")
-
-        session = requests.Session()
-        headers = {
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br, zstd',
-            'Accept-Language': 'fr-FR,fr;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Connection': 'keep-alive',
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-        }
+def _has_session_errors(result):
+    return any(m.get('error') == SESSION_EXPIRED_ERROR
+               for direction in ('inbound', 'outbound') for m in result.get(direction, []))
 
-        login_page_response = session.get(
-            'https://erac.hkremarketing.com/Login?ReturnUrl=%2FVendor%2FCollection%2FOutbound', headers=headers)
-        login_page_soup = BeautifulSoup(login_page_response.text, 'html.parser')
-        token_element = login_page_soup.find('input', {'name': '__RequestVerificationToken'})
-        if not token_element:
-            raise ValueError("Token de verification non trouve")
-        token = token_element['value']
 
-        login_payload = {'LoginId': login_id, 'Password': password, '__RequestVerificationToken': token}
-        login_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        login_headers.update(headers)
-
-        session.post('https://erac.hkremarketing.com/Login?ReturnUrl=%2FVendor%2FCollection%2FOutbound',
-                     data=login_payload, headers=login_headers)
-        session.post('https://erac.hkremarketing.com/Login?ReturnUrl=%2FVendor%2FCollection%2FInbound',
-                     data=login_payload, headers=login_headers)
+def _scrape_erac_country(country, enrich_details):
+    session = None
+    try:
+        print(f"Debut scraping ERAC {country.upper()}...")
 
-        terms_page_response = session.get('https://erac.hkremarketing.com/vendor/scoc', headers=headers)
-        terms_page_soup = BeautifulSoup(terms_page_response.text, 'html.parser')
-        token_element = terms_page_soup.find('input', {'name': '__RequestVerificationToken'})
-        accept_payload = {'action': 'agree'}
-        if token_element:
-            accept_payload['__RequestVerificationToken'] = token_element['value']
-        accept_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        accept_headers.update(headers)
-        session.post('https://erac.hkremarketing.com/vendor/scoc', data=accept_payload, headers=accept_headers)
+        session, headers = get_erac_session(country)
 
         ajax_headers = {'Accept': 'application/json, text/javascript, */*; q=0.01', 'X-Requested-With': 'XMLHttpRequest'}
         ajax_headers.update(headers)
@@ -522,17 +1529,28 @@ def scrape_erac_country(country="france", enrich_details=True):
         ajax_payload_inbound = dict(ajax_payload_outbound)
         ajax_payload_inbound['Code'] = 'inbound'
 
-        ajax_response_inbound = session.post('https://erac.hkremarketing.com/Vendor/AjaxSearch',
-                                             data=ajax_payload_inbound, headers=ajax_headers)
-        ajax_response_outbound = session.post('https://erac.hkremarketing.com/Vendor/AjaxSearch',
-                                              data=ajax_payload_outbound, headers=ajax_headers)
-
-        data_inbound = ajax_response_inbound.json()
-        data_outbound = ajax_response_outbound.json()
+        def relogin():
+            nonlocal session
+            release_erac_session(country, session)
+            session = None
+            session, new_headers = get_erac_session(country)
+            ajax_headers.update(new_headers)
+            return session
+
+        try:
+            data_inbound, data_outbound = _ajax_search(session, ajax_headers, ajax_payload_inbound, ajax_payload_outbound)
+        except ValueError:
+            # Cookies partagés expirés (page de login au lieu du JSON) : reconnexion puis un nouvel essai
+            invalidate_erac_session(country)
+            relogin()
+            data_inbound, data_outbound = _ajax_search(session, ajax_headers, ajax_payload_inbound, ajax_payload_outbound)
 
         if enrich_details:
-            enriched_inbound = enrich_missions_with_details(session, data_inbound['data'], country, ajax_headers, delay=0.3)
-            enriched_outbound = enrich_missions_with_details(session, data_outbound['data'], country, ajax_headers, delay=0.3)
+            with profile_span('enrich'):
+                enriched_inbound = enrich_missions_with_details(session, data_inbound['data'], country, ajax_headers,
+                                                                delay=0.3, relogin=relogin)
+                enriched_outbound = enrich_missions_with_details(session, data_outbound['data'], country, ajax_headers,
+                                                                 delay=0.3, relogin=relogin)
         else:
             enriched_inbound = data_inbound['data']
             enriched_outbound = data_outbound['data']
@@ -551,117 +1569,139 @@ def scrape_erac_country(country="france", enrich_details=True):
     except Exception as e:
         print(f"Erreur scraping {country.upper()}: {str(e)}")
         raise
+    finally:
+        if session is not None:
+            release_erac_session(country, session)
+
+
+def _ajax_search(session, ajax_headers, payload_inbound, payload_outbound):
+    with profile_span('ajax_search'):
+        response_inbound = session.post('https://erac.hkremarketing.com/Vendor/AjaxSearch',
+                                        data=payload_inbound, headers=ajax_headers)
+        response_outbound = session.post('https://erac.hkremarketing.com/Vendor/AjaxSearch',
+                                         data=payload_outbound, headers=ajax_headers)
+        return response_inbound.json(), response_outbound.json()
 
 
 # ============================================================
 # ENDPOINTS MISSIONS
 # ============================================================
 
-@app.route('/scrape/france')
-def scrape_france():
+@app.route('/scrape/<account>')
+def scrape_account(account):
+    if account.lower() not in ACCOUNTS:
+        return _unknown_account(account)
     try:
-        data = scrape_erac_country("france", enrich_details=True)
-        return jsonify({'success': True, 'data': data,
-                        'message': f"Scraping FRANCE: {data['total_outbound']} outbound, {data['total_inbound']} inbound"})
+        data = scrape_erac_country(account.lower(), enrich_details=True)
+        with profile_span('jsonify'):
+            return jsonify({'success': True, 'data': data,
+                            'message': f"Scraping {account.upper()}: {data['total_outbound']} outbound, {data['total_inbound']} inbound"})
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e), 'country': 'FRANCE',
+        return jsonify({'success': False, 'error': str(e), 'country': account.upper(),
                         'timestamp': datetime.utcnow().isoformat()}), 500
 
 
-@app.route('/scrape/germany')
-def scrape_germany():
+@app.route('/debug/movement/<movement_id>')
+def debug_movement(movement_id):
+    account = request.args.get('account', next(iter(ACCOUNTS), '')).lower()
+    if account not in ACCOUNTS:
+        return _unknown_account(account)
     try:
-        data = scrape_erac_country("germany", enrich_details=True)
-        return jsonify({'success': True, 'data': data,
-                        'message': f"Scraping GERMANY: {data['total_outbound']} outbound, {data['total_inbound']} inbound"})
+        session, headers = get_erac_session(account)
+        try:
+            details = get_mission_details(session, movement_id, account, headers, debug=True)
+        finally:
+            release_erac_session(account, session)
+        captures = list_debug_captures(kind='movement', ref_id=movement_id)
+        return jsonify({'success': True, 'movement_id': movement_id, 'details': details,
+                        'capture_id': captures[0]['id'] if captures else None})
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e), 'country': 'GERMANY',
-                        'timestamp': datetime.utcnow().isoformat()}), 500
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/debug/movement/<movement_id>')
-def debug_movement(movement_id):
-    try:
-        login_id = os.getenv('ERAC_GERMANY_LOGIN')
-        password = os.getenv('ERAC_GERMANY_PASSWORD')
-        if not login_id or not password:
-            return jsonify({'success': False, 'error': 'Env vars manquantes'}), 500
+# ============================================================
+# INTENDER
+# ============================================================
+
+ERAC_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br, zstd',
+    'Accept-Language': 'fr-FR,fr;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Connection': 'keep-alive',
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
+}
+
 
-        headers = {'Accept': 'text/html,*/*;q=0.8', 'User-Agent': 'Mozilla/5.0'}
-        session = requests.Session()
+def erac_login_for_tender(country="germany"):
+    account = get_account(country)
+    login_id, password = account.credentials()
+
+    session = account.checkout_session()
+    session.cookies.clear()
+    headers = dict(ERAC_HEADERS)
 
+    with profile_span('login'):
         login_page = session.get(
             'https://erac.hkremarketing.com/Login?ReturnUrl=%2FVendor%2FCollection%2FOutbound', headers=headers)
         soup = BeautifulSoup(login_page.text, 'html.parser')
-        token = soup.find('input', {'name': '__RequestVerificationToken'})['value']
+        token_el = soup.find('input', {'name': '__RequestVerificationToken'})
+        if not token_el:
+            raise ValueError("Token non trouve")
+        token = token_el['value']
 
+        login_payload = {'LoginId': login_id, 'Password': password, '__RequestVerificationToken': token}
         login_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
         login_headers.update(headers)
+
         session.post('https://erac.hkremarketing.com/Login?ReturnUrl=%2FVendor%2FCollection%2FOutbound',
-                     data={'LoginId': login_id, 'Password': password, '__RequestVerificationToken': token},
-                     headers=login_headers)
+                     data=login_payload, headers=login_headers)
+        session.post('https://erac.hkremarketing.com/Login?ReturnUrl=%2FVendor%2FCollection%2FInbound',
+                     data=login_payload, headers=login_headers)
 
-        details = get_mission_details(session, movement_id, "germany", headers, debug=True)
-        return jsonify({'success': True, 'movement_id': movement_id, 'details': details})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        terms_page = session.get('https://erac.hkremarketing.com/vendor/scoc', headers=headers)
+        terms_soup = BeautifulSoup(terms_page.text, 'html.parser')
+        token_el = terms_soup.find('input', {'name': '__RequestVerificationToken'})
+        accept_payload = {'action': 'agree'}
+        if token_el:
+            accept_payload['__RequestVerificationToken'] = token_el['value']
+        accept_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        accept_headers.update(headers)
+        session.post('https://erac.hkremarketing.com/vendor/scoc', data=accept_payload, headers=accept_headers)
 
+    return session, headers
 
-# ============================================================
-# INTENDER
-# ============================================================
 
-def erac_login_for_tender(country="germany"):
-    if country.lower() == "germany":
-        login_id = os.getenv('ERAC_GERMANY_LOGIN')
-        password = os.getenv('ERAC_GERMANY_PASSWORD')
-    else:
-        login_id = os.getenv('ERAC_FRANCE_LOGIN')
-        password = os.getenv('ERAC_FRANCE_PASSWORD')
-
-    if not login_id or not password:
-        raise ValueError(f"Env vars manquantes pour {country.upper()}")
-
-    session = requests.Session()
-    headers = {
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Encoding': 'gzip, deflate, br, zstd',
-        'Accept-Language': 'fr-FR,fr;q=0.9,en-US;q=0.8,en;q=0.7',
-        'Connection': 'keep-alive',
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
-    }
+def get_erac_session(country):
+    """
+    Session ERAC connectée, prise dans le pool du compte (à rendre via
+    release_erac_session). Les cookies sont partagés entre workers :
+    un seul worker se connecte, les autres réutilisent ses cookies.
+    """
+    def login():
+        session, _ = erac_login_for_tender(country)
+        try:
+            return [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path}
+                    for c in session.cookies]
+        finally:
+            release_erac_session(country, session)
 
-    login_page = session.get(
-        'https://erac.hkremarketing.com/Login?ReturnUrl=%2FVendor%2FCollection%2FOutbound', headers=headers)
-    soup = BeautifulSoup(login_page.text, 'html.parser')
-    token_el = soup.find('input', {'name': '__RequestVerificationToken'})
-    if not token_el:
-        raise ValueError("Token non trouve")
-    token = token_el['value']
-
-    login_payload = {'LoginId': login_id, 'Password': password, '__RequestVerificationToken': token}
-    login_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    login_headers.update(headers)
-
-    session.post('https://erac.hkremarketing.com/Login?ReturnUrl=%2FVendor%2FCollection%2FOutbound',
-                 data=login_payload, headers=login_headers)
-    session.post('https://erac.hkremarketing.com/Login?ReturnUrl=%2FVendor%2FCollection%2FInbound',
-                 data=login_payload, headers=login_headers)
-
-    terms_page = session.get('https://erac.hkremarketing.com/vendor/scoc', headers=headers)
-    terms_soup = BeautifulSoup(terms_page.text, 'html.parser')
-    token_el = terms_soup.find('input', {'name': '__RequestVerificationToken'})
-    accept_payload = {'action': 'agree'}
-    if token_el:
-        accept_payload['__RequestVerificationToken'] = token_el['value']
-    accept_headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-    accept_headers.update(headers)
-    session.post('https://erac.hkremarketing.com/vendor/scoc', data=accept_payload, headers=accept_headers)
+    cookies = shared_cached(f'session:{cache_namespace(country)}', SESSION_COOKIE_TTL, login)
+    session = get_account(country).checkout_session()
+    session.cookies.clear()
+    for c in cookies:
+        session.cookies.set(c['name'], c['value'], domain=c['domain'], path=c['path'])
+    return session, dict(ERAC_HEADERS)
 
-    return session, headers
+
+def release_erac_session(country, session):
+    get_account(country).release_session(session)
+
+
+def invalidate_erac_session(country):
+    shared_cache_delete(f'session:{cache_namespace(country)}')
 
 
-def parse_tender_vehicles(html_content):
+def parse_tender_vehicles(html_content, decimal_separator=','):
     soup = BeautifulSoup(html_content, 'html.parser')
     vehicles = []
 
@@ -678,14 +1718,14 @@ def parse_tender_vehicles(html_content):
     rows = tbody.find_all('tr') if tbody else []
 
     for idx, row in enumerate(rows):
-        vehicle = parse_tender_row(row, idx)
+        vehicle = parse_tender_row(row, idx, decimal_separator)
         if vehicle:
             vehicles.append(vehicle)
 
     return {'meta': tender_meta, 'vehicles': vehicles, 'count': len(vehicles)}
 
 
-def parse_tender_row(row, idx):
+def parse_tender_row(row, idx, decimal_separator=','):
     try:
         cells = row.find_all('td')
         num_cols = len(cells)
@@ -739,7 +1779,7 @@ def parse_tender_row(row, idx):
         if route_estimate:
             dist_match = re.search(r'([\d,\.]+)\s*km', route_estimate)
             if dist_match:
-                route_distance_km = float(dist_match.group(1).replace(',', '.'))
+                route_distance_km = _parse_float(dist_match.group(1), decimal_separator)
             dur_match = re.search(r'(\d+h\s*\d*m?)', route_estimate)
             if dur_match:
                 route_duration = dur_match.group(1).strip()
@@ -787,16 +1827,35 @@ def parse_tender_row(row, idx):
         return None
 
 
-def scrape_intender(country="germany"):
-    try:
-        session, headers = erac_login_for_tender(country)
+def scrape_intender(country="germany", use_cache=True):
+    """
+    Résultat partagé entre workers pendant SCRAPE_CACHE_TTL secondes. Le dernier
+    InTender est aussi publié pour TENDER_INDEX_TTL secondes afin que chaque
+    worker puisse (re)construire son index de recherche.
+    """
+    if use_cache:
+        result = shared_cached(f'intender:{cache_namespace(country)}', SCRAPE_CACHE_TTL, lambda: _scrape_intender(country))
+    else:
+        result = _scrape_intender(country)
+    publish_latest_intender(country, result)
+    update_tender_index(country, result)
+    return result
 
-        tender_response = session.get('https://erac.hkremarketing.com/Vendor/Tender/InTender', headers=headers)
 
-        if tender_response.status_code != 200:
-            raise ValueError(f"HTTP {tender_response.status_code}")
+def _scrape_intender(country):
+    session = None
+    try:
+        session, headers = get_erac_session(country)
+        html_text = _fetch_intender(session, headers)
+
+        if 'LoginId' in html_text and 'tblVehicles' not in html_text:
+            # Cookies partagés expirés : reconnexion puis un nouvel essai
+            invalidate_erac_session(country)
+            release_erac_session(country, session)
+            session = None
+            session, headers = get_erac_session(country)
+            html_text = _fetch_intender(session, headers)
 
-        html_text = tender_response.text
         has_table = 'tblVehicles' in html_text
         has_login = 'LoginId' in html_text
         has_closed = 'Closed' in html_text
@@ -809,7 +1868,12 @@ def scrape_intender(country="germany"):
             return {'country': country.upper(), 'status': status, 'vehicles': [], 'count': 0,
                     'timestamp': datetime.utcnow().isoformat()}
 
-        result = parse_tender_vehicles(html_text)
+        archive_page('tender', 'intender', country, html_text)
+
+        with profile_span('tender_parse'):
+            result = parse_tender_vehicles(html_text, get_account(country).decimal_separator)
+        if should_capture_debug():
+            capture_debug_page('tender', 'intender', country, html_text, result)
         result['country'] = country.upper()
         result['status'] = 'active'
         result['timestamp'] = datetime.utcnow().isoformat()
@@ -818,30 +1882,798 @@ def scrape_intender(country="germany"):
     except Exception as e:
         print(f"Erreur InTender: {str(e)}")
         raise
+    finally:
+        if session is not None:
+            release_erac_session(country, session)
+
+
+def _fetch_intender(session, headers):
+    with profile_span('tender_fetch'):
+        tender_response = session.get('https://erac.hkremarketing.com/Vendor/Tender/InTender', headers=headers)
+    if tender_response.status_code != 200:
+        raise ValueError(f"HTTP {tender_response.status_code}")
+    return tender_response.text
 
 
-@app.route('/scrape/germany/tenders')
-def scrape_germany_tenders():
+@app.route('/scrape/<account>/tenders')
+def scrape_account_tenders(account):
+    if account.lower() not in ACCOUNTS:
+        return _unknown_account(account)
     try:
-        data = scrape_intender("germany")
-        return jsonify({'success': True, 'data': data, 'message': f"InTender GERMANY: {data['count']} vehicules"})
+        data = scrape_intender(account.lower())
+        with profile_span('jsonify'):
+            return jsonify({'success': True, 'data': data, 'message': f"InTender {account.upper()}: {data['count']} vehicules"})
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e), 'country': 'GERMANY',
+        return jsonify({'success': False, 'error': str(e), 'country': account.upper(),
                         'timestamp': datetime.utcnow().isoformat()}), 500
 
 
-@app.route('/scrape/france/tenders')
-def scrape_france_tenders():
+# ============================================================
+# INDEX INTENDER (recherche en mémoire)
+# ============================================================
+# Le dernier InTender parsé par pays est indexé à chaque scrape_intender :
+#   - préfixe code postal de collecte (liste triée + bisect)
+#   - distance (liste triée + bisect)
+#   - ensembles par delivery_town / fuel_type / needs_trailer
+
+TENDER_SORT_FIELDS = ('route_distance_km', 'collection_post_code', 'delivery_town',
+                      'fuel_type', 'vehicle_index')
+TENDER_SEARCH_MAX_PER_PAGE = 500
+
+
+class TenderIndex:
+    def __init__(self, country, result):
+        self.country = country.upper()
+        self.meta = result.get('meta', {})
+        self.status = result.get('status')
+        self.indexed_at = datetime.utcnow().isoformat()
+        self.source_timestamp = result.get('timestamp') or ''
+        self.vehicles = result.get('vehicles', [])
+
+        by_postcode = sorted(((v.get('collection_post_code') or '').upper(), i)
+                             for i, v in enumerate(self.vehicles))
+        self._postcode_keys = [k for k, _ in by_postcode]
+        self._postcode_ids = [i for _, i in by_postcode]
+
+        by_distance = sorted((v['route_distance_km'], i) for i, v in enumerate(self.vehicles)
+                             if v.get('route_distance_km') is not None)
+        self._distance_keys = [d for d, _ in by_distance]
+        self._distance_ids = [i for _, i in by_distance]
+
+        self._by_town = {}
+        self._by_fuel = {}
+        self._by_trailer = {True: set(), False: set()}
+        for i, v in enumerate(self.vehicles):
+            self._by_town.setdefault((v.get('delivery_town') or '').lower(), set()).add(i)
+            self._by_fuel.setdefault((v.get('fuel_type') or '').lower(), set()).add(i)
+            self._by_trailer[bool(v.get('needs_trailer'))].add(i)
+
+    def _postcode_prefix(self, prefix):
+        prefix = prefix.upper()
+        lo = bisect_left(self._postcode_keys, prefix)
+        hi = bisect_left(self._postcode_keys, prefix + '\uffff')
+        return set(self._postcode_ids[lo:hi])
+
+    def _distance_range(self, min_km=None, max_km=None):
+        lo = bisect_left(self._distance_keys, min_km) if min_km is not None else 0
+        hi = bisect_right(self._distance_keys, max_km) if max_km is not None else len(self._distance_keys)
+        return set(self._distance_ids[lo:hi])
+
+    def search(self, collection_post_code=None, delivery_town=None, min_distance_km=None,
+               max_distance_km=None, fuel_type=None, needs_trailer=None,
+               sort=None, descending=False, page=1, per_page=50):
+        candidates = []
+        if collection_post_code:
+            candidates.append(self._postcode_prefix(collection_post_code))
+        if delivery_town:
+            candidates.append(self._by_town.get(delivery_town.lower(), set()))
+        if min_distance_km is not None or max_distance_km is not None:
+            candidates.append(self._distance_range(min_distance_km, max_distance_km))
+        if fuel_type:
+            candidates.append(self._by_fuel.get(fuel_type.lower(), set()))
+        if needs_trailer is not None:
+            candidates.append(self._by_trailer[needs_trailer])
+
+        if candidates:
+            candidates.sort(key=len)
+            ids = set.intersection(*candidates)
+        else:
+            ids = set(range(len(self.vehicles)))
+
+        if sort == 'route_distance_km':
+            # Ordre pré-calculé ; les véhicules sans distance restent en fin de liste
+            ordered = [i for i in self._distance_ids if i in ids]
+            if descending:
+                ordered.reverse()
+            ordered += sorted(i for i in ids if self.vehicles[i].get('route_distance_km') is None)
+        elif sort:
+            # Même règle que pour la distance : valeurs absentes en fin de liste, quel que soit l'ordre
+            present = [i for i in ids if self.vehicles[i].get(sort) is not None]
+            ordered = sorted(present, key=lambda i: self.vehicles[i][sort], reverse=descending)
+            ordered += sorted(i for i in ids if self.vehicles[i].get(sort) is None)
+        else:
+            ordered = sorted(ids)
+
+        start = (page - 1) * per_page
+        return {
+            'total': len(ordered),
+            'page': page,
+            'per_page': per_page,
+            'vehicles': [self.vehicles[i] for i in ordered[start:start + per_page]],
+        }
+
+
+_tender_indexes = {}
+_tender_indexes_lock = threading.Lock()
+
+TENDER_INDEX_TTL = int(os.environ.get('TENDER_INDEX_TTL', 7 * 24 * 3600))
+
+
+def update_tender_index(country, result):
+    index = TenderIndex(country, result)
+    with _tender_indexes_lock:
+        _tender_indexes[country.lower()] = index
+    return index
+
+
+def publish_latest_intender(country, result):
+    """Publie le dernier InTender dans l'état partagé (clé + horodatage séparé, lu à chaque recherche)."""
+    namespace = cache_namespace(country)
+    timestamp = result.get('timestamp') or ''
+    if timestamp <= (shared_cache_get(f'intender_latest_ts:{namespace}') or ''):
+        return
+    shared_cache_set(f'intender_latest:{namespace}', result, TENDER_INDEX_TTL)
+    shared_cache_set(f'intender_latest_ts:{namespace}', timestamp, TENDER_INDEX_TTL)
+
+
+def get_tender_index(country):
+    """
+    Index local du pays, reconstruit depuis l'état partagé s'il est absent ou
+    plus ancien que le dernier InTender publié par un autre worker.
+    """
+    with _tender_indexes_lock:
+        index = _tender_indexes.get(country.lower())
+    namespace = cache_namespace(country)
+    latest_ts = shared_cache_get(f'intender_latest_ts:{namespace}')
+    if latest_ts and (index is None or index.source_timestamp < latest_ts):
+        result = shared_cache_get(f'intender_latest:{namespace}')
+        if result is not None:
+            index = update_tender_index(country, result)
+    return index
+
+
+def _parse_bool_arg(value):
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes', 'oui')
+
+
+@app.route('/tenders/<country>/search')
+def search_tenders(country):
+    if country.lower() not in ACCOUNTS:
+        return _unknown_account(country)
+    index = get_tender_index(country)
+    if index is None:
+        return jsonify({'success': False, 'country': country.upper(),
+                        'error': f"Aucun InTender en mémoire : appeler /scrape/{country.lower()}/tenders"}), 404
+
+    sort = request.args.get('sort')
+    if sort and sort not in TENDER_SORT_FIELDS:
+        return jsonify({'success': False, 'error': f"Tri inconnu: {sort}"}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), TENDER_SEARCH_MAX_PER_PAGE)
+
+    result = index.search(
+        collection_post_code=request.args.get('collection_post_code'),
+        delivery_town=request.args.get('delivery_town'),
+        min_distance_km=request.args.get('min_distance_km', type=float),
+        max_distance_km=request.args.get('max_distance_km', type=float),
+        fuel_type=request.args.get('fuel_type'),
+        needs_trailer=_parse_bool_arg(request.args.get('needs_trailer')),
+        sort=sort,
+        descending=request.args.get('order', 'asc').lower() == 'desc',
+        page=page,
+        per_page=per_page,
+    )
+    return jsonify({'success': True, 'country': index.country, 'status': index.status,
+                    'indexed_at': index.indexed_at, 'meta': index.meta, **result})
+
+
+# ============================================================
+# EXPORT CSV / ARROW / PARQUET
+# ============================================================
+# Schéma fixe et à plat : (colonne, type). Types : string, float, int, date, bool.
+# Une valeur non parsable (date, distance, montant) devient null.
+
+MISSION_EXPORT_SCHEMA = [
+    ('country', 'string'),
+    ('direction', 'string'),
+    ('movement_id', 'string'),
+    ('registration', 'string'),
+    ('unit_no', 'string'),
+    ('make_model', 'string'),
+    ('vin', 'string'),
+    ('fuel_type', 'string'),
+    ('group_code', 'string'),
+    ('delivery_charge', 'float'),
+    ('allocation_date', 'date'),
+    ('expected_delivery_date', 'date'),
+    ('collection_date', 'date'),
+    ('delivery_date', 'date'),
+    ('route_estimate', 'string'),
+    ('route_distance_km', 'float'),
+    ('route_duration', 'string'),
+    ('collection_name', 'string'),
+    ('collection_address', 'string'),
+    ('collection_tel', 'string'),
+    ('collection_email', 'string'),
+    ('collection_special_instructions', 'string'),
+    ('delivery_name', 'string'),
+    ('delivery_address', 'string'),
+    ('delivery_tel', 'string'),
+    ('delivery_email', 'string'),
+    ('delivery_special_instructions', 'string'),
+    ('error', 'string'),
+]
+
+TENDER_EXPORT_SCHEMA = [
+    ('country', 'string'),
+    ('tender_end_date', 'date'),
+    ('tender_vehicle_id', 'string'),
+    ('vehicle_index', 'int'),
+    ('make_model', 'string'),
+    ('vehicle_type', 'string'),
+    ('fuel_type', 'string'),
+    ('collection_code', 'string'),
+    ('collection_town', 'string'),
+    ('collection_post_code', 'string'),
+    ('delivery_code', 'string'),
+    ('delivery_town', 'string'),
+    ('delivery_post_code', 'string'),
+    ('route_estimate_raw', 'string'),
+    ('route_distance_km', 'float'),
+    ('route_duration', 'string'),
+    ('desired_collect_date', 'date'),
+    ('desired_delivery_date', 'date'),
+    ('existing_charge', 'float'),
+    ('existing_delivery_date', 'date'),
+    ('service_type', 'string'),
+    ('service_type_label', 'string'),
+    ('service_options', 'string'),
+    ('special_instructions', 'string'),
+    ('needs_trailer', 'bool'),
+    ('link_move', 'string'),
+]
+
+EXPORT_FORMATS = ('csv', 'arrow', 'parquet')
+
+
+def _parse_date(value):
+    """DD/MM/YYYY, DD.MM.YYYY, YYYY-MM-DD ou /Date(ms)/ → date, sinon None."""
+    if not value:
+        return None
+    text = str(value)
+    ms = re.search(r'/Date\((-?\d+)', text)
+    if ms:
+        try:
+            return datetime.utcfromtimestamp(int(ms.group(1)) / 1000).date()
+        except (ValueError, OverflowError, OSError):
+            return None
+    raw = _extract_date_from_text(text)
+    if not raw:
+        return None
+    normalized = raw.replace('.', '/').replace('-', '/')
+    for fmt in ('%d/%m/%Y', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(normalized, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_float(value, decimal_separator=','):
+    """
+    Montant selon la locale du compte ('1.234,50 €' avec ',', '1,234.50' avec '.')
+    → float. Séparateurs incohérents ou groupement douteux → None.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    group_separator = '.' if decimal_separator == ',' else ','
+    text = str(value).replace('\xa0', '').replace('\u202f', '').replace(' ', '').replace("'", '')
+    m = re.search(r'-?\d[\d.,]*', text)
+    if not m:
+        return None
+    token = m.group(0).rstrip('.,')
+    integer, _, fraction = token.partition(decimal_separator)
+    if decimal_separator in fraction or group_separator in fraction:
+        return None
+    if group_separator in integer:
+        # Le groupement doit être régulier : 1.234.567 (sinon '123.5' en locale ',' est ambigu)
+        if not re.fullmatch(r'-?\d{1,3}(?:' + re.escape(group_separator) + r'\d{3})+', integer):
+            return None
+        integer = integer.replace(group_separator, '')
+    return float(f'{integer}.{fraction}' if fraction else integer)
+
+
+def _coerce(value, type_, decimal_separator=','):
+    if type_ == 'float':
+        return _parse_float(value, decimal_separator)
+    if type_ == 'date':
+        return _parse_date(value)
+    if type_ == 'int':
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if type_ == 'bool':
+        return bool(value) if value is not None else None
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+def flatten_mission(mission, country, direction):
+    coll = mission.get('collection_address_full') or {}
+    deliv = mission.get('delivery_address_full') or {}
+    row = {
+        'country': country.upper(),
+        'direction': direction,
+        'movement_id': mission.get('Id') or mission.get('movement_id'),
+        'registration': mission.get('registration') or mission.get('RegNo'),
+        'unit_no': mission.get('unit_no') or mission.get('UnitNo'),
+        'make_model': mission.get('make_model') or mission.get('MakeModel'),
+        'vin': mission.get('vin'),
+        'fuel_type': mission.get('fuel_type'),
+        'group_code': mission.get('GroupCode'),
+        'delivery_charge': mission.get('delivery_charge') or mission.get('DeliveryCharge'),
+        'allocation_date': mission.get('AllocationDate'),
+        'expected_delivery_date': mission.get('ExpectedDeliveryDate'),
+        'collection_date': mission.get('collection_date'),
+        'delivery_date': mission.get('delivery_date'),
+        'route_estimate': mission.get('route_estimate'),
+        'route_distance_km': mission.get('route_distance_km'),
+        'route_duration': mission.get('route_duration'),
+        'error': mission.get('error'),
+    }
+    for prefix, section in (('collection', coll), ('delivery', deliv)):
+        for field in ('name', 'address', 'tel', 'email', 'special_instructions'):
+            row[f'{prefix}_{field}'] = section.get(field)
+    decimal_separator = get_account(country).decimal_separator
+    return {col: _coerce(row.get(col), type_, decimal_separator) for col, type_ in MISSION_EXPORT_SCHEMA}
+
+
+def flatten_tender_vehicle(vehicle, country, meta=None):
+    options = vehicle.get('service_options') or []
+    selected = next((o for o in options if o.get('selected')), None)
+    row = dict(vehicle)
+    row['country'] = country.upper()
+    row['tender_end_date'] = (meta or {}).get('enddate')
+    row['service_type_label'] = selected.get('label') if selected else None
+    row['service_options'] = '|'.join(f"{o.get('value', '')}:{o.get('label', '')}" for o in options)
+    decimal_separator = get_account(country).decimal_separator
+    return {col: _coerce(row.get(col), type_, decimal_separator) for col, type_ in TENDER_EXPORT_SCHEMA}
+
+
+def _csv_stream(rows, schema):
+    """Génère le CSV ligne par ligne (dates ISO, null → champ vide)."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([col for col, _ in schema])
+    yield buf.getvalue()
+    for row in rows:
+        buf.seek(0)
+        buf.truncate(0)
+        writer.writerow(['' if row[col] is None else
+                         row[col].isoformat() if type_ == 'date' else row[col]
+                         for col, type_ in schema])
+        yield buf.getvalue()
+
+
+def _arrow_table(rows, schema):
+    types = {'string': pa.string(), 'float': pa.float64(), 'int': pa.int64(),
+             'date': pa.date32(), 'bool': pa.bool_()}
+    arrow_schema = pa.schema([(col, types[type_]) for col, type_ in schema])
+    return pa.Table.from_pylist(list(rows), schema=arrow_schema)
+
+
+def export_response(rows, schema, fmt, filename):
+    if fmt == 'csv':
+        return Response(_csv_stream(rows, schema), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.csv'})
+
+    if pa is None:
+        return jsonify({'success': False, 'error': 'pyarrow non installé'}), 501
+
+    table = _arrow_table(rows, schema)
+    sink = io.BytesIO()
+    if fmt == 'parquet':
+        pq.write_table(table, sink)
+        mimetype = 'application/vnd.apache.parquet'
+    else:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        mimetype = 'application/vnd.apache.arrow.file'
+    return Response(sink.getvalue(), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}.{fmt}'})
+
+
+@app.route('/export/<country>/missions.<fmt>')
+def export_missions(country, fmt):
+    country = country.lower()
+    if country not in ACCOUNTS or fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"Export inconnu: {country}/{fmt}"}), 404
+    try:
+        data = scrape_erac_country(country, enrich_details=True)
+        rows = [flatten_mission(m, country, direction)
+                for direction in ('inbound', 'outbound')
+                for m in data[direction]]
+        return export_response(rows, MISSION_EXPORT_SCHEMA, fmt, f'missions_{country}')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e), 'country': country.upper(),
+                        'timestamp': datetime.utcnow().isoformat()}), 500
+
+
+@app.route('/export/<country>/tenders.<fmt>')
+def export_tenders(country, fmt):
+    country = country.lower()
+    if country not in ACCOUNTS or fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"Export inconnu: {country}/{fmt}"}), 404
+    try:
+        data = scrape_intender(country)
+        rows = [flatten_tender_vehicle(v, country, data.get('meta')) for v in data['vehicles']]
+        return export_response(rows, TENDER_EXPORT_SCHEMA, fmt, f'tenders_{country}')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e), 'country': country.upper(),
+                        'timestamp': datetime.utcnow().isoformat()}), 500
+
+
+# ============================================================
+# WEBHOOKS (détection de changements des missions)
+# ============================================================
+# Si WATCH_INTERVAL > 0, un thread lance toutes les WATCH_INTERVAL secondes un
+# scraping listing-only (sans enrichissement) par pays de WATCH_COUNTRIES et
+# compare les Id + empreintes de lignes au passage précédent. Seuls les
+# mouvements nouveaux/modifiés sont enrichis ; le lot de changements est mis
+# dans l'outbox SQLite partagée puis POSTé (par lots, avec retries) aux
+# webhooks enregistrés. Le premier passage sert de référence (aucun envoi).
+# WEBHOOK_TEST_RECEIVER=true expose /webhooks/test-receiver (tests locaux uniquement).
+# Les threads de livraison/détection ne démarrent pas à l'import (tests, CLI
+# reparse) : `python main.py` les lance, les workers gunicorn définissent
+# WEBHOOK_THREADS=true.
+# Les lots contiennent des données personnelles : les routes /webhooks* et
+# /watch/* exigent l'en-tête X-Erac-Admin-Token: <WEBHOOK_ADMIN_TOKEN>
+# (désactivées si WEBHOOK_ADMIN_TOKEN n'est pas défini).
+
+WATCH_INTERVAL = int(os.environ.get('WATCH_INTERVAL', 0))
+WATCH_COUNTRIES = [c.strip().lower() for c in os.environ.get('WATCH_COUNTRIES', ','.join(ACCOUNTS)).split(',') if c.strip()]
+WATCH_STATE_TTL = 30 * 24 * 3600
+WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', 20))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', 6))
+WEBHOOK_RETRY_BASE = int(os.environ.get('WEBHOOK_RETRY_BASE', 30))
+WEBHOOK_TIMEOUT = int(os.environ.get('WEBHOOK_TIMEOUT', 10))
+WEBHOOK_DELIVERY_INTERVAL = 5
+WEBHOOK_TEST_RECEIVER = os.environ.get('WEBHOOK_TEST_RECEIVER', 'false').lower() == 'true'
+WEBHOOK_ADMIN_TOKEN = os.environ.get('WEBHOOK_ADMIN_TOKEN')
+WEBHOOK_THREADS = os.environ.get('WEBHOOK_THREADS', 'false').lower() == 'true'
+
+_watch_threads_started = False
+_test_receiver_events = deque(maxlen=100)
+
+
+def _row_fingerprint(row):
+    return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def run_watch(country, force=False):
+    """
+    Un passage de détection pour `country`. Renvoie le lot de changements,
+    {} si rien n'a changé, ou None si un autre worker s'en occupe déjà.
+    """
+    country = country.lower()
+    namespace = cache_namespace(country)
+    owner = acquire_shared_lock(f'watch:{namespace}')
+    if not owner:
+        return None
+    keep_shared_lock_alive(f'watch:{namespace}', owner, SHARED_LOCK_TTL)
     try:
-        data = scrape_intender("france")
-        return jsonify({'success': True, 'data': data, 'message': f"InTender FRANCE: {data['count']} vehicules"})
+        state = shared_cache_get(f'watch:{namespace}')
+        if state and not force and time.time() - state['last_run'] < WATCH_INTERVAL * 0.9:
+            return None
+
+        listing = scrape_erac_country(country, enrich_details=False, use_cache=False)
+        current, rows = {}, {}
+        for direction in ('inbound', 'outbound'):
+            for row in listing[direction]:
+                key = f"{direction}:{row.get('Id')}"
+                current[key] = _row_fingerprint(row)
+                rows[key] = (direction, row)
+
+        batch = {}
+        fingerprints = dict(current)
+        ids = {k: rows[k][1].get('Id') for k in current}
+        if state is not None:
+            previous = state['fingerprints']
+            added = [k for k in current if k not in previous]
+            changed = [k for k in current if k in previous and previous[k] != current[k]]
+            removed = [k for k in previous if k not in current]
+            if added or changed or removed:
+                batch, failed = _build_change_batch(country, rows, added, changed, removed, state.get('ids', {}))
+                # Enrichissement en échec : empreinte précédente conservée → retenté au prochain passage
+                for key in failed:
+                    if key in previous:
+                        fingerprints[key] = previous[key]
+                    else:
+                        del fingerprints[key]
+                if batch['added'] or batch['changed'] or batch['removed']:
+                    enqueue_webhook_event(country, batch)
+                else:
+                    batch = {}
+
+        shared_cache_set(f'watch:{namespace}', {'last_run': time.time(), 'fingerprints': fingerprints, 'ids': ids},
+                         WATCH_STATE_TTL)
+        return batch
+    finally:
+        release_shared_lock(f'watch:{namespace}', owner)
+
+
+def _build_change_batch(country, rows, added, changed, removed, previous_ids):
+    """Renvoie (lot, clés dont l'enrichissement a échoué) ; les échecs sont exclus du lot."""
+    to_enrich = added + changed
+    for key in changed:
+        # Les détails en cache peuvent être antérieurs au changement
+        shared_cache_delete(f"movement:{cache_namespace(country)}:{rows[key][1].get('Id')}")
+
+    enriched = {}
+    if to_enrich:
+        session, headers = get_erac_session(country)
+
+        def relogin():
+            nonlocal session
+            release_erac_session(country, session)
+            session = None
+            session, _ = get_erac_session(country)
+            return session
+
+        try:
+            missions = enrich_missions_with_details(session, [rows[k][1] for k in to_enrich], country, headers,
+                                                    relogin=relogin)
+        finally:
+            if session is not None:
+                release_erac_session(country, session)
+        enriched = dict(zip(to_enrich, missions))
+    failed = [k for k in to_enrich if enriched[k].get('error')]
+
+    def entry(key):
+        return {'direction': rows[key][0], **enriched[key]}
+
+    def removed_entry(key):
+        direction, movement_id = key.split(':', 1)
+        return {'direction': direction, 'movement_id': previous_ids.get(key, movement_id)}
+
+    return {
+        'country': country.upper(),
+        'detected_at': datetime.utcnow().isoformat(),
+        'added': [entry(k) for k in added if k not in failed],
+        'changed': [entry(k) for k in changed if k not in failed],
+        'removed': [removed_entry(k) for k in removed],
+    }, failed
+
+
+def enqueue_webhook_event(country, batch):
+    conn = _shared_db()
+    payload = json.dumps(batch, ensure_ascii=False, default=str)
+    hooks = conn.execute('SELECT id, countries FROM webhooks').fetchall()
+    for hook_id, countries in hooks:
+        if not countries or country.lower() in countries.split(','):
+            conn.execute('INSERT INTO webhook_outbox (webhook_id, payload, next_attempt_at) VALUES (?, ?, ?)',
+                         (hook_id, payload, time.time()))
+
+
+def deliver_pending_webhooks():
+    """
+    POST les événements dus, regroupés par webhook (WEBHOOK_BATCH_SIZE max par requête).
+    Chaque lot est réclamé (next_attempt_at repoussé au-delà du timeout) avant
+    l'envoi : un autre worker ne peut pas le POSTer en parallèle, et un worker
+    mort en cours d'envoi laisse simplement le lot redevenir dû. Après
+    WEBHOOK_MAX_ATTEMPTS échecs l'événement passe en statut 'dead'.
+    """
+    conn = _shared_db()
+    delivered = 0
+    hooks = conn.execute("SELECT DISTINCT o.webhook_id, w.url FROM webhook_outbox o "
+                         "JOIN webhooks w ON w.id = o.webhook_id "
+                         "WHERE o.status = 'pending' AND o.next_attempt_at <= ?",
+                         (time.time(),)).fetchall()
+    for hook_id, url in hooks:
+        pending = _claim_webhook_events(conn, hook_id)
+        if not pending:
+            continue
+        try:
+            response = requests.post(url, json={'events': [json.loads(p[1]) for p in pending]},
+                                     timeout=WEBHOOK_TIMEOUT)
+            if response.status_code >= 300:
+                raise ValueError(f"HTTP {response.status_code}")
+            conn.executemany('DELETE FROM webhook_outbox WHERE id = ?', [(p[0],) for p in pending])
+            delivered += len(pending)
+        except Exception as e:
+            print(f"Erreur webhook {url}: {str(e)}")
+            for event_id, _, attempts in pending:
+                if attempts + 1 >= WEBHOOK_MAX_ATTEMPTS:
+                    conn.execute("UPDATE webhook_outbox SET attempts = ?, status = 'dead', last_error = ? "
+                                 "WHERE id = ?", (attempts + 1, str(e), event_id))
+                else:
+                    conn.execute('UPDATE webhook_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? '
+                                 'WHERE id = ?',
+                                 (attempts + 1, time.time() + WEBHOOK_RETRY_BASE * 2 ** attempts,
+                                  str(e), event_id))
+    return delivered
+
+
+def _claim_webhook_events(conn, hook_id):
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        pending = conn.execute("SELECT id, payload, attempts FROM webhook_outbox "
+                               "WHERE webhook_id = ? AND status = 'pending' AND next_attempt_at <= ? "
+                               "ORDER BY id LIMIT ?",
+                               (hook_id, now, WEBHOOK_BATCH_SIZE)).fetchall()
+        conn.executemany('UPDATE webhook_outbox SET next_attempt_at = ? WHERE id = ?',
+                         [(now + WEBHOOK_TIMEOUT * 2, p[0]) for p in pending])
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return pending
+
+
+def _watch_loop():
+    while True:
+        for country in WATCH_COUNTRIES:
+            try:
+                run_watch(country)
+            except Exception as e:
+                print(f"Erreur watch {country.upper()}: {str(e)}")
+        time.sleep(WATCH_INTERVAL)
+
+
+def _delivery_loop():
+    while True:
+        try:
+            deliver_pending_webhooks()
+        except Exception as e:
+            print(f"Erreur livraison webhooks: {str(e)}")
+        time.sleep(WEBHOOK_DELIVERY_INTERVAL)
+
+
+def start_watch_threads():
+    """Livraison toujours active (reprend les envois en attente après un redémarrage) ; détection si WATCH_INTERVAL > 0."""
+    global _watch_threads_started
+    if _watch_threads_started or not SHARED_STATE_PATH:
+        return
+    _watch_threads_started = True
+    threading.Thread(target=_delivery_loop, name='webhook-delivery', daemon=True).start()
+    if WATCH_INTERVAL > 0:
+        threading.Thread(target=_watch_loop, name='watch', daemon=True).start()
+
+
+def _webhooks_denied():
+    if not SHARED_STATE_PATH:
+        return jsonify({'success': False, 'error': 'SHARED_STATE_PATH requis pour les webhooks'}), 503
+    token = request.headers.get('X-Erac-Admin-Token')
+    if not WEBHOOK_ADMIN_TOKEN or token is None or not hmac.compare_digest(token, WEBHOOK_ADMIN_TOKEN):
+        return jsonify({'success': False, 'error': "Jeton d'administration invalide"}), 403
+    return None
+
+
+@app.route('/webhooks', methods=['GET'])
+def list_webhooks():
+    denied = _webhooks_denied()
+    if denied:
+        return denied
+    rows = _shared_db().execute('SELECT id, url, countries, created_at FROM webhooks ORDER BY id').fetchall()
+    return jsonify({'success': True, 'webhooks': [
+        {'id': r[0], 'url': r[1], 'countries': r[2].split(',') if r[2] else [], 'created_at': r[3]} for r in rows]})
+
+
+@app.route('/webhooks', methods=['POST'])
+def register_webhook():
+    denied = _webhooks_denied()
+    if denied:
+        return denied
+    body = request.get_json(silent=True) or {}
+    url = body.get('url')
+    if not url or not url.startswith(('http://', 'https://')):
+        return jsonify({'success': False, 'error': 'url http(s) requise'}), 400
+    countries = ','.join(c.lower() for c in body.get('countries', []))
+    cur = _shared_db().execute('INSERT INTO webhooks (url, countries, created_at) VALUES (?, ?, ?)',
+                               (url, countries, datetime.utcnow().isoformat()))
+    return jsonify({'success': True, 'id': cur.lastrowid}), 201
+
+
+@app.route('/webhooks/<int:webhook_id>', methods=['DELETE'])
+def delete_webhook(webhook_id):
+    denied = _webhooks_denied()
+    if denied:
+        return denied
+    conn = _shared_db()
+    conn.execute('DELETE FROM webhook_outbox WHERE webhook_id = ?', (webhook_id,))
+    cur = conn.execute('DELETE FROM webhooks WHERE id = ?', (webhook_id,))
+    if cur.rowcount == 0:
+        return jsonify({'success': False, 'error': 'Webhook introuvable'}), 404
+    return jsonify({'success': True, 'id': webhook_id})
+
+
+@app.route('/webhooks/dead-letters', methods=['GET'])
+def list_dead_letters():
+    denied = _webhooks_denied()
+    if denied:
+        return denied
+    rows = _shared_db().execute("SELECT id, webhook_id, attempts, last_error, payload FROM webhook_outbox "
+                                "WHERE status = 'dead' ORDER BY id").fetchall()
+    return jsonify({'success': True, 'count': len(rows), 'events': [
+        {'id': r[0], 'webhook_id': r[1], 'attempts': r[2], 'last_error': r[3], 'payload': json.loads(r[4])}
+        for r in rows]})
+
+
+@app.route('/webhooks/dead-letters/requeue', methods=['POST'])
+def requeue_dead_letters():
+    denied = _webhooks_denied()
+    if denied:
+        return denied
+    cur = _shared_db().execute("UPDATE webhook_outbox SET status = 'pending', attempts = 0, next_attempt_at = ? "
+                               "WHERE status = 'dead'", (time.time(),))
+    return jsonify({'success': True, 'requeued': cur.rowcount})
+
+
+@app.route('/watch/<country>/run', methods=['POST'])
+def watch_run(country):
+    denied = _webhooks_denied()
+    if denied:
+        return denied
+    if country.lower() not in ACCOUNTS:
+        return _unknown_account(country)
+    try:
+        batch = run_watch(country, force=True)
+        if batch is None:
+            return jsonify({'success': False, 'error': 'Détection déjà en cours'}), 409
+        delivered = deliver_pending_webhooks()
+        return jsonify({'success': True, 'country': country.upper(), 'changes': batch, 'delivered': delivered})
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e), 'country': 'FRANCE',
+        return jsonify({'success': False, 'error': str(e), 'country': country.upper(),
                         'timestamp': datetime.utcnow().isoformat()}), 500
 
 
+if WEBHOOK_TEST_RECEIVER:
+    # Les payloads contiennent des données personnelles : jamais actif par défaut.
+    @app.route('/webhooks/test-receiver', methods=['GET', 'POST'])
+    def webhook_test_receiver():
+        """Récepteur local pour tester la livraison (à enregistrer comme URL de webhook)."""
+        if request.method == 'POST':
+            _test_receiver_events.append({'received_at': datetime.utcnow().isoformat(),
+                                          'body': request.get_json(silent=True)})
+            return jsonify({'success': True})
+        return jsonify({'success': True, 'received': list(_test_receiver_events)})
+
+
+if WEBHOOK_THREADS:
+    # Workers gunicorn : pas de bloc __main__, les threads démarrent à l'import
+    start_watch_threads()
+
+
 if __name__ == '__main__':
+    # Re-parse hors ligne : python main.py reparse movement|tender [country]
+    if len(sys.argv) > 1 and sys.argv[1] == 'reparse':
+        kind = sys.argv[2] if len(sys.argv) > 2 else 'movement'
+        country = sys.argv[3] if len(sys.argv) > 3 else None
+        for item in reparse_archive(kind, country=country):
+            print(json.dumps(item, ensure_ascii=False))
+        sys.exit(0)
+
     port = int(os.environ.get('PORT', 5030))
     debug = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     print(f"ERAC Scraper v3.2 sur port {port}")
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # En debug, seul le process servi par le reloader lance les threads
+        start_watch_threads()
     app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,48 @@
+# Profilage à la demande : corps streamés et accès aux profils
+import json
+import os
+import sys
+
+from flask import Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+
+
+def _stream():
+    for i in range(3):
+        sum(range(50000))
+        yield f'{i}\n'
+
+
+main.app.add_url_rule('/_test/stream', '_test_stream', lambda: Response(_stream(), mimetype='text/plain'))
+
+
+def _client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'PROFILE_TOKEN', 'secret')
+    monkeypatch.setattr(main, 'PROFILE_DIR', str(tmp_path))
+    return main.app.test_client()
+
+
+def test_streamed_body_is_profiled_under_request(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    response = client.get('/_test/stream', headers={'X-Erac-Profile': 'secret'})
+    assert response.data == b'0\n1\n2\n'
+    profile_id = response.headers['X-Erac-Profile-Id']
+    response.close()
+
+    with open(tmp_path / f'{profile_id}.json', encoding='utf-8') as f:
+        stages = json.load(f)['stages']
+    assert stages['request']['total_ms'] >= stages['stream_body']['total_ms']
+    folded = (tmp_path / f'{profile_id}.folded').read_text(encoding='utf-8')
+    assert 'request;stream_body ' in folded
+    assert main._profile_local.run is None
+
+
+def test_profiles_require_token_header(tmp_path, monkeypatch):
+    client = _client(tmp_path, monkeypatch)
+    assert client.get('/profiles').status_code == 403
+    assert client.get('/profiles?token=secret').status_code == 403
+    assert client.get('/profiles', headers={'X-Erac-Profile': 'wrong'}).status_code == 403
+    assert client.get('/profiles', headers={'X-Erac-Profile': 'secret'}).status_code == 200
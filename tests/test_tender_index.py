@@ -0,0 +1,91 @@
+# Tests unitaires de TenderIndex (logique pure, sans accès ERAC)
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import TenderIndex
+
+
+VEHICLES = [
+    {'id': 'a', 'collection_post_code': '75001', 'delivery_town': 'Paris',
+     'route_distance_km': 120, 'fuel_type': 'Diesel', 'needs_trailer': False, 'model': 'Clio'},
+    {'id': 'b', 'collection_post_code': '75015', 'delivery_town': 'Lyon',
+     'route_distance_km': 460, 'fuel_type': 'Essence', 'needs_trailer': True, 'model': 'Megane'},
+    {'id': 'c', 'collection_post_code': '69003', 'delivery_town': 'Paris',
+     'route_distance_km': None, 'fuel_type': 'Diesel', 'needs_trailer': False, 'model': None},
+    {'id': 'd', 'collection_post_code': '7500', 'delivery_town': 'Lille',
+     'route_distance_km': 220, 'fuel_type': 'diesel', 'needs_trailer': False, 'model': 'Austral'},
+    {'id': 'e', 'collection_post_code': None, 'delivery_town': None,
+     'route_distance_km': 30, 'fuel_type': None, 'needs_trailer': None},
+]
+
+
+def make_index():
+    return TenderIndex('fr', {'meta': {}, 'status': 'ok', 'timestamp': '2024-01-01T00:00:00',
+                              'vehicles': VEHICLES})
+
+
+def ids(result):
+    return [v['id'] for v in result['vehicles']]
+
+
+def test_no_filter_returns_everything_in_source_order():
+    result = make_index().search()
+    assert result['total'] == 5
+    assert ids(result) == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_postcode_prefix():
+    index = make_index()
+    assert ids(index.search(collection_post_code='750')) == ['a', 'b', 'd']
+    assert ids(index.search(collection_post_code='7500')) == ['a', 'd']
+    assert ids(index.search(collection_post_code='75001')) == ['a']
+    assert index.search(collection_post_code='13')['total'] == 0
+
+
+def test_distance_range_is_inclusive_and_skips_missing():
+    index = make_index()
+    assert ids(index.search(min_distance_km=120, max_distance_km=220)) == ['a', 'd']
+    assert ids(index.search(min_distance_km=200)) == ['b', 'd']
+    assert ids(index.search(max_distance_km=30)) == ['e']
+
+
+def test_exact_filters_are_case_insensitive():
+    index = make_index()
+    assert ids(index.search(delivery_town='paris')) == ['a', 'c']
+    assert ids(index.search(fuel_type='DIESEL')) == ['a', 'c', 'd']
+    assert ids(index.search(needs_trailer=True)) == ['b']
+    assert ids(index.search(needs_trailer=False)) == ['a', 'c', 'd', 'e']
+
+
+def test_filters_intersect():
+    index = make_index()
+    assert ids(index.search(collection_post_code='75', fuel_type='diesel')) == ['a', 'd']
+    assert ids(index.search(delivery_town='Paris', max_distance_km=500)) == ['a']
+    assert index.search(delivery_town='Lyon', needs_trailer=False)['total'] == 0
+
+
+def test_sort_by_distance_keeps_missing_last():
+    index = make_index()
+    assert ids(index.search(sort='route_distance_km')) == ['e', 'a', 'd', 'b', 'c']
+    assert ids(index.search(sort='route_distance_km', descending=True)) == ['b', 'd', 'a', 'e', 'c']
+
+
+def test_sort_by_other_field_keeps_missing_last():
+    index = make_index()
+    assert ids(index.search(sort='model')) == ['d', 'a', 'b', 'c', 'e']
+    assert ids(index.search(sort='model', descending=True)) == ['b', 'a', 'd', 'c', 'e']
+
+
+def test_pagination():
+    index = make_index()
+    first = index.search(sort='route_distance_km', page=1, per_page=2)
+    second = index.search(sort='route_distance_km', page=2, per_page=2)
+    last = index.search(sort='route_distance_km', page=3, per_page=2)
+    assert first['total'] == second['total'] == last['total'] == 5
+    assert (first['page'], first['per_page']) == (1, 2)
+    assert ids(first) == ['e', 'a']
+    assert ids(second) == ['d', 'b']
+    assert ids(last) == ['c']
+    assert index.search(page=4, per_page=2)['vehicles'] == []